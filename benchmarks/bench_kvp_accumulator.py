@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2025 University of Dundee.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Compare the memory used to hold Key-Value pairs for many Images with a
+dict of defaultdict(list) per Image and with the KeyValueAccumulator.
+
+    $ python benchmarks/bench_kvp_accumulator.py --images 100000
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+from collections import defaultdict
+
+from omero_biofilefinder.kvp_accumulator import KeyValueAccumulator
+
+KEYS = {
+    "Gene Symbol": 2000,
+    "Gene Identifier": 2000,
+    "Phenotype": 50,
+    "Organism": 3,
+    "Cell Line": 20,
+    "Antibody": 200,
+    "Treatment": 30,
+    "Concentration": 10,
+}
+
+
+def make_kvps(image_count, seed=0):
+    """
+    Yield (image_id, key, value) like Map annotations loaded from OMERO,
+    where each string is a separate object.
+    """
+    rng = random.Random(seed)
+    for image_id in range(image_count):
+        for key, distinct in KEYS.items():
+            value = f"{key} {rng.randrange(distinct)}"
+            yield image_id, "".join(key), value
+        # Some Images have several values for the same Key
+        if image_id % 10 == 0:
+            yield image_id, "".join("Phenotype"), f"Phenotype {rng.randrange(50)}"
+
+
+def dict_of_lists(image_count):
+    kvp = {}
+    for image_id, key, value in make_kvps(image_count):
+        if image_id not in kvp:
+            kvp[image_id] = defaultdict(list)
+        kvp[image_id][key].append(value)
+    return kvp
+
+
+def accumulator(image_count):
+    acc = KeyValueAccumulator()
+    for image_id in range(image_count):
+        acc.add_image(image_id)
+    for image_id, key, value in make_kvps(image_count):
+        acc.add(image_id, key, value)
+    return acc
+
+
+def measure(name, func, image_count):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(image_count)
+    duration = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{name:<20} held: {current / 1e6:8.1f} MB  peak: {peak / 1e6:8.1f} MB"
+        f"  time: {duration:6.2f} s"
+    )
+    return result, current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--images", type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"{args.images} Images, {len(KEYS)} Keys per Image")
+    _, dict_size = measure("dict of lists", dict_of_lists, args.images)
+    acc, acc_size = measure("KeyValueAccumulator", accumulator, args.images)
+    print(f"Memory reduction: {dict_size / acc_size:.1f}x")
+
+    start = time.perf_counter()
+    acc.to_arrays()
+    print(f"to_arrays(): {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
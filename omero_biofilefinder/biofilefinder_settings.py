@@ -33,6 +33,145 @@ BIOFILEFINDER_SETTINGS_MAPPING = {
             "know it is running under https."
         ),
     ],
+    "omero.web.bff.multi_value_mode": [
+        "MULTI_VALUE_MODE",
+        "join",
+        str,
+        (
+            "How to load Keys that have several values on the same Image. "
+            "'join' concatenates the values with omero.web.bff.value_delimiter. "
+            "'list' loads Key-Value pairs on the fly as parquet, with list "
+            "columns for these Keys."
+        ),
+    ],
+    "omero.web.bff.value_delimiter": [
+        "VALUE_DELIMITER",
+        ",",
+        str,
+        "Delimiter used to join several values for the same Key on an Image.",
+    ],
+    "omero.web.bff.extra_columns": [
+        "EXTRA_COLUMNS",
+        "",
+        str,
+        (
+            "Comma-separated Image metadata to add as columns: dimensions, "
+            "pixel_size, channels, acquisition_date, tags, roi_count. "
+            "Each is loaded with one query per batch of Images."
+        ),
+    ],
+    "omero.web.bff.max_concurrent_exports": [
+        "MAX_CONCURRENT_EXPORTS",
+        2,
+        int,
+        (
+            "Maximum number of exports (csv or parquet loaded on the fly) that "
+            "can run at once in each web worker. Further requests get a 503 "
+            "response with a Retry-After header."
+        ),
+    ],
+    "omero.web.bff.retry_after": [
+        "RETRY_AFTER",
+        30,
+        int,
+        "Seconds in the Retry-After header when too many exports are running.",
+    ],
+    "omero.web.bff.single_flight_dir": [
+        "SINGLE_FLIGHT_DIR",
+        "",
+        str,
+        (
+            "Directory for lock files, so that identical exports requested from "
+            "different web workers only run once. If empty, requests are only "
+            "shared within each web worker."
+        ),
+    ],
+    "omero.web.bff.single_flight_timeout": [
+        "SINGLE_FLIGHT_TIMEOUT",
+        600,
+        int,
+        "Seconds to wait for an identical export to finish before giving up.",
+    ],
+    "omero.web.bff.cache_dir": [
+        "CACHE_DIR",
+        "",
+        str,
+        (
+            "Directory for caching BFF tables on the web server. If empty, "
+            "a directory in the system temp dir is used."
+        ),
+    ],
+    "omero.web.bff.cache_ttl": [
+        "CACHE_TTL",
+        300,
+        int,
+        "Seconds before a cached table of Key-Value pairs is rebuilt from OMERO.",
+    ],
+    "omero.web.bff.file_cache_size": [
+        "FILE_CACHE_SIZE",
+        1024,
+        int,
+        (
+            "Maximum size in MB of parquet files from OMERO cached in "
+            "omero.web.bff.cache_dir. The least recently used files are deleted "
+            "first."
+        ),
+    ],
+    "omero.web.bff.sendfile_header": [
+        "SENDFILE_HEADER",
+        "",
+        str,
+        (
+            "Let the web server send cached files, e.g. 'X-Accel-Redirect' for "
+            "nginx or 'X-Sendfile' for Apache. If empty, Django sends the file."
+        ),
+    ],
+    "omero.web.bff.sendfile_prefix": [
+        "SENDFILE_PREFIX",
+        "/bff_cache/",
+        str,
+        (
+            "For X-Accel-Redirect, the nginx 'internal' location that maps to "
+            "omero.web.bff.cache_dir."
+        ),
+    ],
+    "omero.web.bff.csv_max_size": [
+        "CSV_MAX_SIZE",
+        5,
+        int,
+        (
+            "Estimated size in MB above which Key-Value pairs are loaded on the "
+            "fly as parquet instead of csv."
+        ),
+    ],
+    "omero.web.bff.on_the_fly_max_images": [
+        "ON_THE_FLY_MAX_IMAGES",
+        2000,
+        int,
+        (
+            "Maximum number of Images to load on the fly. For more Images, "
+            "users can export to parquet in the background instead."
+        ),
+    ],
+    "omero.web.bff.group_index_rebuild": [
+        "GROUP_INDEX_REBUILD",
+        24,
+        int,
+        (
+            "Hours before the index of a group is rebuilt from scratch. In "
+            "between, it is refreshed with the Images that have changed."
+        ),
+    ],
+    "omero.web.bff.compression": [
+        "COMPRESSION",
+        "zstd,br,gzip",
+        str,
+        (
+            "Comma-separated encodings for compressing responses, in order of "
+            "preference, if accepted by the browser. 'br' and 'zstd' need the "
+            "brotli and zstandard packages. Use '' to disable compression."
+        ),
+    ],
 }
 
 process_custom_settings(sys.modules[__name__], "BIOFILEFINDER_SETTINGS_MAPPING")
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2025 University of Dundee.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Compression of responses, negotiated with the Accept-Encoding header.
+
+gzip is always available. brotli ("br") and zstd are used if the brotli
+or zstandard packages are installed.
+"""
+
+import os
+import threading
+import zlib
+
+from django.http import HttpResponse
+
+from . import biofilefinder_settings as settings
+from .table_cache import path_lock
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# File extensions for compressed copies of cached files
+EXTENSIONS = {"gzip": "gz", "br": "br", "zstd": "zst"}
+# Don't compress small responses
+MIN_SIZE = 1024
+CHUNK_SIZE = 1024 * 1024
+
+
+class _BrotliCompressor:
+
+    def __init__(self):
+        # The default quality (11) is too slow for dynamic content
+        self._compressor = brotli.Compressor(quality=5)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+def available_encodings():
+    """Encodings from omero.web.bff.compression that we can use."""
+    encodings = []
+    for encoding in settings.COMPRESSION.split(","):
+        encoding = encoding.strip().lower()
+        if encoding == "gzip":
+            encodings.append(encoding)
+        elif encoding == "br" and brotli is not None:
+            encodings.append(encoding)
+        elif encoding == "zstd" and zstandard is not None:
+            encodings.append(encoding)
+    return encodings
+
+
+def negotiate_encoding(request):
+    """
+    Return the first encoding in omero.web.bff.compression that is accepted
+    by the client, or None.
+    """
+    accepted = {}
+    for item in request.headers.get("Accept-Encoding", "").split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in available_encodings():
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > 0:
+            return encoding
+    return None
+
+
+def get_compressor(encoding):
+    """Return an object with compress(data) and flush() methods."""
+    if encoding == "gzip":
+        # wbits=31 for gzip headers
+        return zlib.compressobj(6, zlib.DEFLATED, 31)
+    if encoding == "br":
+        return _BrotliCompressor()
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor().compressobj()
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def compress_chunks(chunks, encoding):
+    """Compress an iterable of bytes incrementally, yielding compressed bytes."""
+    compressor = get_compressor(encoding)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def compressed_response(request, chunks, content_type):
+    """
+    Return an HttpResponse with the content from an iterable of bytes,
+    compressed as the content is produced if the client accepts it.
+
+    Only the compressed content is held in memory. It is not streamed, as
+    single_flight() needs the whole response to share it with identical
+    requests.
+    """
+    encoding = negotiate_encoding(request)
+    if encoding is not None:
+        chunks = compress_chunks(chunks, encoding)
+    response = HttpResponse(b"".join(chunks), content_type=content_type)
+    if encoding is not None:
+        response["Content-Encoding"] = encoding
+    response["Vary"] = "Accept-Encoding"
+    return response
+
+
+def compress_content(request, content, content_type):
+    """Return an HttpResponse for the content, compressed if not small."""
+    if len(content) < MIN_SIZE:
+        response = HttpResponse(content, content_type=content_type)
+        response["Vary"] = "Accept-Encoding"
+        return response
+    return compressed_response(request, [content], content_type)
+
+
+def compressed_file(path, encoding):
+    """
+    Return the path to a compressed copy of a file, creating it if needed,
+    so that the file is only compressed once. Concurrent requests for the
+    same copy wait for the first one to compress it.
+    """
+    compressed_path = f"{path}.{EXTENSIONS[encoding]}"
+    try:
+        # Update the mtime, used to find the least recently used files
+        os.utime(compressed_path)
+        return compressed_path
+    except FileNotFoundError:
+        # Not compressed yet, or evicted from the cache
+        pass
+
+    def read_chunks():
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                yield chunk
+
+    with path_lock(compressed_path):
+        # Another thread may have compressed the file while we waited
+        if not os.path.exists(compressed_path):
+            tmp_path = f"{compressed_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                for data in compress_chunks(read_chunks(), encoding):
+                    f.write(data)
+            os.replace(tmp_path, compressed_path)
+    return compressed_path
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2025 University of Dundee.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Local disk cache of OMERO OriginalFiles, e.g. parquet FileAnnotations.
+
+Files are named by their ID, size and hash, so a cached file is never
+stale. Compressed copies are stored next to each file. The least recently
+used files are deleted when the cache is bigger than
+omero.web.bff.file_cache_size.
+"""
+
+import os
+import threading
+import time
+
+from django.http import FileResponse, HttpResponse
+
+from . import biofilefinder_settings as settings
+from .compression import compressed_file, negotiate_encoding
+from .table_cache import get_cache_dir, path_lock
+
+# Files used in the last minute are not evicted, so that a path returned by
+# get_cached_file() can still be opened
+MIN_AGE = 60
+
+
+def cached_file_name(orig_file):
+    file_hash = orig_file.getHash() or ""
+    return f"{orig_file.id}_{orig_file.getSize()}_{file_hash}"
+
+
+def evict(cache_dir, max_size, keep=None):
+    """
+    Delete the least recently used files until the cache fits in max_size,
+    except for the file at the path to keep and those used in the last
+    MIN_AGE seconds.
+    """
+    min_mtime = time.time() - MIN_AGE
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(".tmp"):
+            continue
+        try:
+            if entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
+            # Evicted by another process
+            pass
+    total_size = sum(size for _, size, _ in entries)
+    for mtime, size, path in sorted(entries):
+        if total_size <= max_size:
+            break
+        if path == keep or mtime > min_mtime:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Already evicted by another process
+            pass
+        total_size -= size
+
+
+def get_cached_file(ann):
+    """
+    Return the path to a local copy of the FileAnnotation's file,
+    downloading it from OMERO if it isn't cached.
+    """
+    cache_dir = get_cache_dir("files")
+    path = os.path.join(cache_dir, cached_file_name(ann.getFile()))
+    try:
+        # Update the mtime, used to find the least recently used files
+        os.utime(path)
+        return path
+    except FileNotFoundError:
+        # Not cached yet, or just evicted
+        pass
+
+    with path_lock(path):
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    for chunk in ann.getFileInChunks():
+                        f.write(chunk)
+                os.replace(tmp_path, path)
+            except BaseException:
+                # Don't leave part of the file behind if the download failed
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            evict(cache_dir, settings.FILE_CACHE_SIZE * 1024 * 1024, keep=path)
+    return path
+
+
+def file_response(request, path, file_name, content_type):
+    """
+    Serve a cached file, letting the web server send it if configured
+    with omero.web.bff.sendfile_header.
+
+    Otherwise, if the client accepts compression, we serve a compressed
+    copy of the file (created on the first request).
+    """
+    header = settings.SENDFILE_HEADER
+    encoding = None
+    if not header and "Range" not in request.headers:
+        encoding = negotiate_encoding(request)
+    if header == "X-Accel-Redirect":
+        # nginx internal location that maps to the cache dir
+        rel_path = os.path.relpath(path, get_cache_dir(""))
+        response = HttpResponse(content_type=content_type)
+        response[header] = settings.SENDFILE_PREFIX.rstrip("/") + "/" + rel_path
+    elif header:
+        # e.g. Apache mod_xsendfile uses the full path
+        response = HttpResponse(content_type=content_type)
+        response[header] = path
+    elif encoding is not None:
+        compressed_path = compressed_file(path, encoding)
+        response = FileResponse(open(compressed_path, "rb"), content_type=content_type)
+        response["Content-Encoding"] = encoding
+        response["Vary"] = "Accept-Encoding"
+    else:
+        response = FileResponse(open(path, "rb"), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{file_name}"'
+    return response
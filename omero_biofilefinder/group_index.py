@@ -0,0 +1,715 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2025 University of Dundee.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Index of all the Images in a group, with their containers and Key-Value
+pairs, for opening a whole group in BFF.
+
+The index is a directory of parquet "parts" on the web server. It is built
+by paging through the Dataset and Plate hierarchies with projection
+queries and loading Key-Value pairs in chunks. A refresh only rewrites the
+parts with Images that have changed since the last refresh, found from the
+update events of Map annotations, links and containers, and from the links
+that were removed (which have no update events). The parts are then
+combined into a single parquet file for BFF.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import omero
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from django.urls import reverse
+from omero.gateway import BlitzGateway
+from omero.rtypes import rlong, rtime, unwrap
+
+from . import biofilefinder_settings as settings
+from .kvp_accumulator import MULTI_VALUE_JOIN, KeyValueAccumulator
+from .table_cache import get_cache_dir
+
+PAGE_SIZE = 5000
+PART_ROWS = 100000
+ANNOTATIONS_BATCH_SIZE = 1000
+# Seconds of overlap between refreshes, for clock differences between the
+# web and OMERO servers. Images are reloaded so this is safe.
+REFRESH_OVERLAP = 60
+# Seconds before the session of a refresh is closed if it is idle
+SESSION_IDLE = 600
+
+IMAGE_ID = "Image ID"
+COLUMNS = [
+    IMAGE_ID,
+    "File Path",
+    "File Name",
+    "Project",
+    "Dataset",
+    "Screen",
+    "Plate",
+    "Well",
+    "Thumbnail",
+]
+UPLOADED = "Uploaded"
+
+# Each hierarchy is paged by link ID, then the rows are loaded for a page
+# of link IDs or for a batch of Image IDs.
+HIERARCHY_IDS_QUERIES = {
+    "dataset": """
+        select dil.id from DatasetImageLink dil where dil.id > :last
+        order by dil.id
+        """,
+    "plate": """
+        select ws.id from WellSample ws where ws.id > :last order by ws.id
+        """,
+}
+HIERARCHY_QUERIES = {
+    "dataset": """
+        select img.id, img.name, img.details.creationEvent.time, p.name, ds.name
+        from DatasetImageLink dil join dil.child img join dil.parent ds
+            left outer join ds.projectLinks pdl left outer join pdl.parent p
+        where {where}
+        """,
+    "plate": """
+        select img.id, img.name, img.details.creationEvent.time, s.name, pl.name,
+            w.row, w.column
+        from WellSample ws join ws.image img join ws.well w join w.plate pl
+            left outer join pl.screenLinks spl left outer join spl.parent s
+        where {where}
+        """,
+}
+HIERARCHY_WHERE = {
+    "dataset": {"links": "dil.id in (:ids)", "images": "img.id in (:ids)"},
+    "plate": {"links": "ws.id in (:ids)", "images": "img.id in (:ids)"},
+}
+ROW_COUNT_QUERIES = [
+    """
+    select count(dil.id)
+    from DatasetImageLink dil join dil.parent ds
+        left outer join ds.projectLinks pdl
+    """,
+    """
+    select count(ws.id)
+    from WellSample ws join ws.well w join w.plate pl
+        left outer join pl.screenLinks spl
+    """,
+]
+KVP_QUERY = """
+    select ial.parent.id, mv.name, mv.value
+    from MapAnnotation ann join ann.mapValue mv, ImageAnnotationLink ial
+    where ial.child.id = ann.id and ial.parent.id in (:ids)
+    order by ial.id, index(mv)
+    """
+# Links that give the rows of the index, as (link ID, child ID) for the
+# links with IDs above :last. The links are saved in the index, to find the
+# Images of removed links (e.g. unlinked Key-Value pairs or Datasets, or
+# deleted Projects), since removed objects have no update events.
+LINK_QUERIES = {
+    "map": """
+        select ial.id, ial.parent.id
+        from ImageAnnotationLink ial, MapAnnotation ann
+        where ial.child.id = ann.id and ial.id > :last order by ial.id
+        """,
+    "dataset": """
+        select dil.id, dil.child.id from DatasetImageLink dil
+        where dil.id > :last order by dil.id
+        """,
+    "project": """
+        select pdl.id, pdl.child.id from ProjectDatasetLink pdl
+        where pdl.id > :last order by pdl.id
+        """,
+    "well": """
+        select ws.id, ws.image.id from WellSample ws
+        where ws.id > :last order by ws.id
+        """,
+    "screen": """
+        select spl.id, spl.child.id from ScreenPlateLink spl
+        where spl.id > :last order by spl.id
+        """,
+}
+# Links are counted to find if any were removed
+LINK_COUNT_QUERIES = {
+    "map": """
+        select count(ial.id), max(ial.id)
+        from ImageAnnotationLink ial, MapAnnotation ann
+        where ial.child.id = ann.id and ial.id > :last
+        """,
+    "dataset": """
+        select count(dil.id), max(dil.id) from DatasetImageLink dil
+        where dil.id > :last
+        """,
+    "project": """
+        select count(pdl.id), max(pdl.id) from ProjectDatasetLink pdl
+        where pdl.id > :last
+        """,
+    "well": """
+        select count(ws.id), max(ws.id) from WellSample ws where ws.id > :last
+        """,
+    "screen": """
+        select count(spl.id), max(spl.id) from ScreenPlateLink spl
+        where spl.id > :last
+        """,
+}
+# Images of the children of links, for links that aren't to Images
+LINK_IMAGES_QUERIES = {
+    "project": """
+        select dil.child.id from DatasetImageLink dil where dil.parent.id in (:ids)
+        """,
+    "screen": """
+        select ws.image.id from WellSample ws where ws.well.plate.id in (:ids)
+        """,
+}
+# Images with Key-Value pairs or containers changed since :time
+CHANGED_IMAGES_QUERIES = [
+    """
+    select ial.parent.id from ImageAnnotationLink ial, MapAnnotation ann
+    where ial.child.id = ann.id and (ann.details.updateEvent.time > :time
+        or ial.details.updateEvent.time > :time)
+    """,
+    """
+    select img.id from Image img where img.details.updateEvent.time > :time
+    """,
+    """
+    select dil.child.id from DatasetImageLink dil
+    where dil.details.updateEvent.time > :time
+        or dil.parent.details.updateEvent.time > :time
+    """,
+    """
+    select dil.child.id from DatasetImageLink dil, ProjectDatasetLink pdl
+    where dil.parent.id = pdl.child.id and (pdl.details.updateEvent.time > :time
+        or pdl.parent.details.updateEvent.time > :time)
+    """,
+    """
+    select ws.image.id from WellSample ws
+    where ws.details.updateEvent.time > :time
+        or ws.well.plate.details.updateEvent.time > :time
+    """,
+    """
+    select ws.image.id from WellSample ws, ScreenPlateLink spl
+    where ws.well.plate.id = spl.child.id and (spl.details.updateEvent.time > :time
+        or spl.parent.details.updateEvent.time > :time)
+    """,
+]
+
+_lock = threading.Lock()
+# {index dir: Thread} for refreshes running in this process
+_refreshes = {}
+
+
+def index_dir(conn, group_id):
+    """
+    Directory of the index for a group.
+
+    Members of groups that are not private can see the same data, so they
+    share an index. Otherwise each user has their own index.
+    """
+    group = conn.getObject("ExperimenterGroup", group_id)
+    server = conn.getConfigService().getDatabaseUuid()
+    key = ["group", str(group_id), server]
+    if not group.getDetails().getPermissions().isGroupRead():
+        key.append(str(conn.getUserId()))
+    name = hashlib.sha256(":".join(key).encode()).hexdigest()
+    return get_cache_dir(os.path.join("group_index", name))
+
+
+def read_state(path):
+    """Return the state of the index in the directory, or None if not built."""
+    try:
+        with open(os.path.join(path, "state.json")) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_state(path, state):
+    state_path = os.path.join(path, "state.json")
+    tmp_path = f"{state_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path)
+
+
+def combined_path(path, state=None):
+    """Path of the parquet file of the whole index, or None if not built."""
+    state = state or read_state(path)
+    if state is None:
+        return None
+    return os.path.join(path, state["combined"])
+
+
+def is_stale(state):
+    return state is None or time.time() - state["refreshed"] >= settings.CACHE_TTL
+
+
+def _projection(conn, query, params):
+    qs = conn.getQueryService()
+    return [unwrap(row) for row in qs.projection(query, params, conn.SERVICE_OPTS)]
+
+
+def _count(conn, queries):
+    params = omero.sys.ParametersI()
+    return sum(_projection(conn, query, params)[0][0] or 0 for query in queries)
+
+
+def well_position(row, column):
+    """e.g. "B3" for row 1, column 2."""
+    if row is None or column is None:
+        return None
+    row_name = chr(ord("A") + row) if row < 26 else str(row + 1)
+    return f"{row_name}{column + 1}"
+
+
+def _hierarchy_rows(conn, hierarchy, where, ids):
+    """Rows of {column: value} for a batch of link or Image IDs."""
+    params = omero.sys.ParametersI()
+    params.addIds(ids)
+    query = HIERARCHY_QUERIES[hierarchy].format(where=HIERARCHY_WHERE[hierarchy][where])
+    # BFF is hosted by omero-web, so we don't need absolute URLs
+    base_url = reverse("index")
+    rows = []
+    for result in _projection(conn, query, params):
+        iid, name, created = result[:3]
+        row = {
+            IMAGE_ID: iid,
+            # we end URL with .png so that BFF enables open-with "Browser"
+            "File Path": f"{base_url}webclient/?show=image-{iid}&_=.png",
+            "File Name": name,
+            "Thumbnail": f"{base_url}webgateway/render_thumbnail/{iid}/",
+            UPLOADED: datetime.fromtimestamp(created / 1000).strftime(
+                "%Y-%m-%d %H:%M:%S"
+            ),
+        }
+        if hierarchy == "dataset":
+            row["Project"], row["Dataset"] = result[3:5]
+        else:
+            row["Screen"], row["Plate"] = result[3:5]
+            row["Well"] = well_position(*result[5:7])
+        rows.append(row)
+    return rows
+
+
+def _build_table(conn, rows):
+    """Return a Table of the rows with a column for each Key."""
+    accumulator = KeyValueAccumulator()
+    for row in rows:
+        accumulator.add_image(row[IMAGE_ID])
+    image_ids = list(dict.fromkeys(accumulator.image_ids))
+    for i in range(0, len(image_ids), ANNOTATIONS_BATCH_SIZE):
+        params = omero.sys.ParametersI()
+        params.addIds(image_ids[i : i + ANNOTATIONS_BATCH_SIZE])
+        for iid, key, value in _projection(conn, KVP_QUERY, params):
+            accumulator.add(iid, key, value)
+
+    columns = {IMAGE_ID: pa.array(accumulator.image_ids, type=pa.int64())}
+    for name in COLUMNS[1:]:
+        columns[name] = pa.array([row.get(name) for row in rows], type=pa.string())
+    # Parts have different Keys, so all Key columns are strings
+    arrays = accumulator.to_arrays(
+        mode=MULTI_VALUE_JOIN, delimiter=settings.VALUE_DELIMITER
+    )
+    for key, array in zip(accumulator.keys(), arrays):
+        if key in columns or key == UPLOADED:
+            key = f"{key} (Key-Value)"
+        columns[key] = array.cast(pa.string())
+    columns[UPLOADED] = pa.array([row[UPLOADED] for row in rows], type=pa.string())
+    return pa.table(columns)
+
+
+class _PartWriter:
+    """Writes tables to parquet parts of up to PART_ROWS rows."""
+
+    def __init__(self, path, state):
+        self.path = path
+        self.state = state
+        self._tables = []
+        self._rows = 0
+
+    def add(self, table):
+        self._tables.append(table)
+        self._rows += table.num_rows
+        if self._rows >= PART_ROWS:
+            self.flush()
+
+    def flush(self):
+        if not self._tables:
+            return
+        table = pa.concat_tables(self._tables, promote_options="default")
+        name = f"part_{self.state['next_part']:06d}.parquet"
+        self.state["next_part"] += 1
+        pq.write_table(table, os.path.join(self.path, name))
+        self.state["parts"].append(name)
+        self._tables = []
+        self._rows = 0
+
+
+def _build_all(conn, path, state):
+    """Page through the hierarchies, writing all the rows to new parts."""
+    writer = _PartWriter(path, state)
+    for hierarchy, ids_query in HIERARCHY_IDS_QUERIES.items():
+        last = -1
+        while True:
+            params = omero.sys.ParametersI()
+            params.add("last", rlong(last))
+            params.page(0, PAGE_SIZE)
+            link_ids = [row[0] for row in _projection(conn, ids_query, params)]
+            if not link_ids:
+                break
+            rows = _hierarchy_rows(conn, hierarchy, "links", link_ids)
+            if rows:
+                writer.add(_build_table(conn, rows))
+            last = link_ids[-1]
+    writer.flush()
+
+
+def _update_images(conn, path, state, image_ids):
+    """Replace the rows of the Images in the parts."""
+    id_set = pa.array(sorted(image_ids), type=pa.int64())
+    parts = []
+    old_parts = []
+    writer = _PartWriter(path, state)
+    for name in state["parts"]:
+        part_path = os.path.join(path, name)
+        ids = pq.read_table(part_path, columns=[IMAGE_ID]).column(IMAGE_ID)
+        if not pc.any(pc.is_in(ids, value_set=id_set)).as_py():
+            parts.append(name)
+            continue
+        table = pq.read_table(part_path)
+        keep = pc.invert(pc.is_in(table.column(IMAGE_ID), value_set=id_set))
+        table = table.filter(keep)
+        old_parts.append(part_path)
+        if table.num_rows > 0:
+            writer.add(table)
+    state["parts"] = parts
+
+    image_ids = sorted(image_ids)
+    for i in range(0, len(image_ids), ANNOTATIONS_BATCH_SIZE):
+        batch_ids = image_ids[i : i + ANNOTATIONS_BATCH_SIZE]
+        rows = []
+        for hierarchy in HIERARCHY_QUERIES:
+            rows.extend(_hierarchy_rows(conn, hierarchy, "images", batch_ids))
+        if rows:
+            writer.add(_build_table(conn, rows))
+    writer.flush()
+    return old_parts
+
+
+def _changed_images(conn, since):
+    params = omero.sys.ParametersI()
+    params.add("time", rtime(int(since * 1000)))
+    image_ids = set()
+    for query in CHANGED_IMAGES_QUERIES:
+        image_ids.update(row[0] for row in _projection(conn, query, params))
+    return image_ids
+
+
+def _write_combined(path, state):
+    """Combine the parts into one parquet file, with the same columns."""
+    part_paths = [os.path.join(path, name) for name in state["parts"]]
+    names = list(COLUMNS)
+    for part_path in part_paths:
+        for name in pq.read_schema(part_path).names:
+            if name not in names and name != UPLOADED:
+                names.append(name)
+    names.append(UPLOADED)
+    schema = pa.schema(
+        [(name, pa.int64() if name == IMAGE_ID else pa.string()) for name in names]
+    )
+
+    state["version"] += 1
+    name = f"combined_{state['version']:06d}.parquet"
+    with pq.ParquetWriter(os.path.join(path, name), schema) as writer:
+        for part_path in part_paths:
+            table = pq.read_table(part_path)
+            columns = [
+                (
+                    table.column(field.name)
+                    if field.name in table.column_names
+                    else pa.nulls(table.num_rows, type=field.type)
+                )
+                for field in schema
+            ]
+            writer.write_table(pa.table(columns, schema=schema))
+    old_combined = state.get("combined")
+    state["combined"] = name
+    return old_combined
+
+
+def _count_links(conn, name, last=-1):
+    """Count the links with IDs above last, returning (count, max ID)."""
+    params = omero.sys.ParametersI()
+    params.add("last", rlong(last))
+    count, max_id = _projection(conn, LINK_COUNT_QUERIES[name], params)[0]
+    return count or 0, max_id if max_id is not None else last
+
+
+def _list_links(conn, name, last=-1):
+    """Return a Table of "link" and "child" IDs for links with IDs above last."""
+    link_ids = []
+    child_ids = []
+    while True:
+        params = omero.sys.ParametersI()
+        params.add("last", rlong(last))
+        params.page(0, PAGE_SIZE)
+        rows = _projection(conn, LINK_QUERIES[name], params)
+        if not rows:
+            break
+        for link_id, child_id in rows:
+            link_ids.append(link_id)
+            child_ids.append(child_id)
+        last = rows[-1][0]
+    return pa.table(
+        {
+            "link": pa.array(link_ids, type=pa.int64()),
+            "child": pa.array(child_ids, type=pa.int64()),
+        }
+    )
+
+
+def _write_links(path, state, name, table):
+    """Write the links to a new file, recorded in the state."""
+    file_name = f"links_{name}_{state['next_part']:06d}.parquet"
+    state["next_part"] += 1
+    pq.write_table(table, os.path.join(path, file_name))
+    last = pc.max(table.column("link")).as_py()
+    state["links"][name] = {
+        "file": file_name,
+        "count": table.num_rows,
+        "last": last if last is not None else -1,
+    }
+
+
+def _link_images(conn, name, child_ids):
+    """IDs of the Images of the links' children."""
+    query = LINK_IMAGES_QUERIES.get(name)
+    if query is None:
+        return set(child_ids)
+    image_ids = set()
+    child_ids = sorted(set(child_ids))
+    for i in range(0, len(child_ids), ANNOTATIONS_BATCH_SIZE):
+        params = omero.sys.ParametersI()
+        params.addIds(child_ids[i : i + ANNOTATIONS_BATCH_SIZE])
+        image_ids.update(row[0] for row in _projection(conn, query, params))
+    return image_ids
+
+
+def _update_links(conn, path, state):
+    """
+    Update the saved links, returning the IDs of the Images whose rows
+    changed because links were removed, and the paths of old link files.
+    """
+    image_ids = set()
+    old_files = []
+    for name in LINK_QUERIES:
+        saved = state["links"][name]
+        count, last = _count_links(conn, name)
+        if count == saved["count"] and last == saved["last"]:
+            continue
+        links_path = os.path.join(path, saved["file"])
+        table = pq.read_table(links_path)
+        new_count, _ = _count_links(conn, name, saved["last"])
+        if count < saved["count"] + new_count:
+            # Some links were removed, so we compare all the links
+            current = _list_links(conn, name)
+            removed = pc.invert(
+                pc.is_in(table.column("link"), value_set=current.column("link"))
+            )
+            child_ids = table.filter(removed).column("child").to_pylist()
+            image_ids.update(_link_images(conn, name, child_ids))
+            table = current
+        else:
+            new_links = _list_links(conn, name, saved["last"])
+            table = pa.concat_tables([table, new_links])
+        _write_links(path, state, name, table)
+        old_files.append(links_path)
+    return image_ids, old_files
+
+
+def _remove_unused_files(path, state):
+    """
+    Remove the parts, links and combined files that aren't in the state,
+    e.g. from a refresh that stopped when the web worker was restarted.
+    """
+    used = set()
+    if state is not None:
+        used.update(state["parts"])
+        used.update(links["file"] for links in state.get("links", {}).values())
+        used.update([state["combined"], state.get("previous")])
+    for name in os.listdir(path):
+        if not name.startswith(("part_", "links_", "combined_")):
+            continue
+        # Compressed copies of a combined file are stored next to it
+        if name.split(".parquet")[0] + ".parquet" in used:
+            continue
+        try:
+            os.remove(os.path.join(path, name))
+        except FileNotFoundError:
+            pass
+
+
+def refresh_index(conn, path):
+    """
+    Build or refresh the index in the directory, with the Images in the
+    current group of the connection.
+
+    Only the Images that changed are reloaded. The index is rebuilt if it
+    is older than omero.web.bff.group_index_rebuild hours, or if its number
+    of rows doesn't match OMERO.
+    """
+    started = time.time()
+    state = read_state(path)
+    _remove_unused_files(path, state)
+    old_files = []
+
+    # Indexes built before links were saved are also rebuilt
+    rebuild = state is None or "links" not in state
+    if not rebuild:
+        rebuild = started - state["built"] >= settings.GROUP_INDEX_REBUILD * 3600
+    changed = rebuild
+    if not rebuild:
+        image_ids, old_files = _update_links(conn, path, state)
+        since = state["refreshed"] - REFRESH_OVERLAP
+        image_ids.update(_changed_images(conn, since))
+        if image_ids:
+            old_files.extend(_update_images(conn, path, state, image_ids))
+            changed = True
+        row_count = sum(
+            pq.read_metadata(os.path.join(path, name)).num_rows
+            for name in state["parts"]
+        )
+        # Should not happen, unless the index missed some changes
+        rebuild = row_count != _count(conn, ROW_COUNT_QUERIES)
+
+    if rebuild:
+        if state is not None:
+            old_files.extend(os.path.join(path, name) for name in state["parts"])
+            old_files.extend(
+                os.path.join(path, links["file"])
+                for links in state.get("links", {}).values()
+            )
+        state = {
+            "built": started,
+            "parts": [],
+            "links": {},
+            "next_part": state["next_part"] if state else 0,
+            "version": state["version"] if state else 0,
+            "combined": state["combined"] if state else None,
+            "previous": state.get("previous") if state else None,
+        }
+        # Links are listed first, so that links removed while the index is
+        # built are found by the next refresh
+        for name in LINK_QUERIES:
+            _write_links(path, state, name, _list_links(conn, name))
+        _build_all(conn, path, state)
+        changed = True
+
+    if changed:
+        # Requests that read the old state may still be using the previous
+        # combined file, so we keep it until the next change
+        if state.get("previous"):
+            old_files.append(os.path.join(path, state["previous"]))
+        state["previous"] = _write_combined(path, state)
+    state["refreshed"] = started
+    _write_state(path, state)
+
+    for old_path in old_files:
+        # Compressed copies of the combined file are stored next to it
+        prefix = os.path.basename(old_path) + "."
+        copies = [
+            os.path.join(path, name)
+            for name in os.listdir(path)
+            if name.startswith(prefix)
+        ]
+        for file_path in [old_path] + copies:
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+    return state
+
+
+def _connect_for_refresh(conn):
+    """
+    Return a connection with a new session for the same user and group, so
+    that a refresh isn't stopped when the user logs out or their session
+    in the web app expires.
+    """
+    group_id = conn.SERVICE_OPTS.getOmeroGroup()
+    group = conn.getObject("ExperimenterGroup", group_id)
+    session = conn.getSessionService().createUserSession(
+        settings.GROUP_INDEX_REBUILD * 3600 * 1000,
+        SESSION_IDLE * 1000,
+        group.getName(),
+    )
+    client = omero.client(
+        conn.c.getProperty("omero.host"), int(conn.c.getProperty("omero.port"))
+    )
+    client.joinSession(session.getUuid().getValue())
+    refresh_conn = BlitzGateway(client_obj=client)
+    refresh_conn.SERVICE_OPTS.setOmeroGroup(group_id)
+    return refresh_conn
+
+
+def _refresh_in_thread(conn, path):
+    lock_path = os.path.join(path, "lock")
+    try:
+        with open(lock_path, "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Another web worker is refreshing the index
+                return
+            try:
+                refresh_index(conn, path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    finally:
+        # Close the session created for the refresh
+        conn.close(hard=True)
+
+
+def is_refreshing(path):
+    """Is the index being refreshed in this process?"""
+    with _lock:
+        thread = _refreshes.get(path)
+        return thread is not None and thread.is_alive()
+
+
+def start_refresh(conn, path):
+    """
+    Refresh the index in a background thread, unless it is already being
+    refreshed. The refresh has its own session, so the connection can be
+    closed when the request is done.
+
+    Returns True if a refresh was started.
+    """
+    with _lock:
+        thread = _refreshes.get(path)
+        if thread is not None and thread.is_alive():
+            return False
+        refresh_conn = _connect_for_refresh(conn)
+        thread = threading.Thread(
+            target=_refresh_in_thread, args=(refresh_conn, path), daemon=True
+        )
+        _refreshes[path] = thread
+        thread.start()
+    return True
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2025 University of Dundee.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Extra Image metadata columns for BFF tables.
+
+Each set of columns is loaded with one HQL query for a batch of Images,
+instead of loading objects for each Image. Pixel sizes are in micrometres.
+"""
+
+from datetime import datetime
+
+import omero
+import pyarrow as pa
+from omero.model import LengthI
+from omero.model.enums import UnitsLength
+from omero.rtypes import unwrap
+
+# Column names for each set of extra columns
+EXTRA_COLUMNS = {
+    "dimensions": ["Size X", "Size Y", "Size Z", "Size C", "Size T"],
+    "pixel_size": ["Pixel Size X (µm)", "Pixel Size Y (µm)", "Pixel Size Z (µm)"],
+    "channels": ["Channels"],
+    "acquisition_date": ["Acquisition Date"],
+    "tags": ["Tags"],
+    "roi_count": ["ROI Count"],
+}
+
+QUERIES = {
+    "dimensions": """
+        select pix.image.id, pix.sizeX, pix.sizeY, pix.sizeZ, pix.sizeC, pix.sizeT
+        from Pixels pix where pix.image.id in (:ids)
+        """,
+    # Pixels objects, to convert the sizes to micrometres with their units
+    "pixel_size": """
+        select pix from Pixels pix where pix.image.id in (:ids)
+        """,
+    "channels": """
+        select pix.image.id, lc.name
+        from Pixels pix join pix.channels ch join ch.logicalChannel lc
+        where pix.image.id in (:ids) order by index(ch)
+        """,
+    "acquisition_date": """
+        select img.id, img.acquisitionDate from Image img where img.id in (:ids)
+        """,
+    "tags": """
+        select link.parent.id, tag.textValue
+        from ImageAnnotationLink link, TagAnnotation tag
+        where link.child.id = tag.id and link.parent.id in (:ids)
+        order by tag.textValue
+        """,
+    "roi_count": """
+        select roi.image.id, count(roi.id) from Roi roi
+        where roi.image.id in (:ids) group by roi.image.id
+        """,
+}
+
+# Columns with several values per Image
+LIST_COLUMNS = ("channels", "tags")
+
+
+def parse_extra_columns(names):
+    """Return the valid names from a list or comma-separated string."""
+    if isinstance(names, str):
+        names = names.split(",")
+    names = [name.strip().lower() for name in names]
+    return [name for name in EXTRA_COLUMNS if name in names]
+
+
+def _pixel_sizes(pixels_list):
+    """Rows of Image ID and pixel sizes in micrometres, from Pixels objects."""
+    rows = []
+    for pixels in pixels_list:
+        row = [pixels.getImage().getId().getValue()]
+        for size in [
+            pixels.getPhysicalSizeX(),
+            pixels.getPhysicalSizeY(),
+            pixels.getPhysicalSizeZ(),
+        ]:
+            if size is not None:
+                size = LengthI(size, UnitsLength.MICROMETER).getValue()
+            row.append(size)
+        rows.append(row)
+    return rows
+
+
+def load_image_metadata(conn, image_ids, extra_columns, batch_size=1000):
+    """
+    Load extra columns for the Images.
+
+    Returns {column name: [value for each Image in image_ids]}. Values of
+    "Channels" and "Tags" are lists of strings.
+    """
+    qs = conn.getQueryService()
+    # An Image can be in several rows, e.g. if it is in several Datasets
+    rows_by_iid = {}
+    for row, iid in enumerate(image_ids):
+        rows_by_iid.setdefault(iid, []).append(row)
+    unique_ids = list(rows_by_iid)
+    columns = {}
+    for name in extra_columns:
+        col_names = EXTRA_COLUMNS[name]
+        is_list = name in LIST_COLUMNS
+        values = [
+            [[] if is_list else None for _ in image_ids] for _ in range(len(col_names))
+        ]
+        for i in range(0, len(unique_ids), batch_size):
+            params = omero.sys.ParametersI()
+            params.addIds(unique_ids[i : i + batch_size])
+            if name == "pixel_size":
+                result = qs.findAllByQuery(QUERIES[name], params, conn.SERVICE_OPTS)
+                result = _pixel_sizes(result)
+            else:
+                result = qs.projection(QUERIES[name], params, conn.SERVICE_OPTS)
+                result = [unwrap(row) for row in result]
+            for row in result:
+                for col, value in enumerate(row[1:]):
+                    if name == "acquisition_date" and value is not None:
+                        value = datetime.fromtimestamp(value / 1000).strftime(
+                            "%Y-%m-%d %H:%M:%S"
+                        )
+                    for idx in rows_by_iid[row[0]]:
+                        if not is_list:
+                            values[col][idx] = value
+                        elif value is not None:
+                            values[col][idx].append(value)
+        columns.update(zip(col_names, values))
+    return columns
+
+
+def metadata_arrays(columns, list_columns=False, delimiter=","):
+    """
+    Return a pyarrow Array for each column from load_image_metadata().
+
+    Lists of values are list<string> if list_columns, otherwise they are
+    joined with delimiter.
+    """
+    arrays = []
+    for values in columns.values():
+        if not any(isinstance(value, list) for value in values):
+            arrays.append(pa.array(values))
+        elif list_columns:
+            values = [value or None for value in values]
+            arrays.append(pa.array(values, type=pa.list_(pa.string())))
+        else:
+            values = [delimiter.join(value) if value else None for value in values]
+            arrays.append(pa.array(values, type=pa.string()))
+    return arrays
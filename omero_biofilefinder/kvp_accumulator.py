@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2025 University of Dundee.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Columnar accumulator for Image Key-Value pairs."""
+
+from array import array
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# How to output Keys that have several values on the same Image
+MULTI_VALUE_JOIN = "join"
+MULTI_VALUE_LIST = "list"
+MULTI_VALUE_MODES = (MULTI_VALUE_JOIN, MULTI_VALUE_LIST)
+
+
+def infer_type(array):
+    """
+    Cast string (or list<string>) values to int64 or float64 if possible.
+
+    Values are only cast if they are the same when cast back to strings, so
+    that e.g. zero-padded IDs like "007" stay as strings, as they are in csv.
+    """
+    is_list = pa.types.is_list(array.type)
+    if is_list:
+        values = pc.list_flatten(array)
+    elif pa.types.is_dictionary(array.type):
+        values = array.dictionary
+    else:
+        values = array
+    for value_type in (pa.int64(), pa.float64()):
+        try:
+            cast_values = values.cast(value_type)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            continue
+        if not pc.all(pc.equal(cast_values.cast(pa.string()), values)).as_py():
+            return array
+        return array.cast(pa.list_(value_type) if is_list else value_type)
+    return array
+
+
+class KeyValueAccumulator:
+    """
+    Collects Key-Value pairs for a list of Images as flat columns.
+
+    Keys and values are interned: each distinct string is stored once and
+    each Key-Value pair is stored as (row, key code, value code) in three
+    int32 arrays. This uses much less memory than a dict of lists of
+    strings for every Image. Columns are built with numpy and returned as
+    pyarrow dictionary arrays, without creating Python objects per row.
+    """
+
+    def __init__(self):
+        self.image_ids = []
+        self._rows_by_iid = {}
+        self._keys = []
+        self._key_codes = {}
+        self._values = []
+        self._value_codes = {}
+        self._rows = array("i")
+        self._key_idx = array("i")
+        self._value_idx = array("i")
+
+    def __len__(self):
+        return len(self.image_ids)
+
+    def add_image(self, image_id):
+        """
+        Add a row for the Image, in the order that rows are output.
+
+        An Image can have several rows, e.g. if it is in several Datasets.
+        """
+        row = len(self.image_ids)
+        self._rows_by_iid.setdefault(image_id, []).append(row)
+        self.image_ids.append(image_id)
+        return row
+
+    def add(self, image_id, key, value):
+        """Add a Key-Value pair to an Image already added with add_image()."""
+        rows = self._rows_by_iid.get(image_id)
+        if rows is None:
+            return
+        key_code = self._key_codes.get(key)
+        if key_code is None:
+            key_code = len(self._keys)
+            self._key_codes[key] = key_code
+            self._keys.append(key)
+        value_code = self._value_codes.get(value)
+        if value_code is None:
+            value_code = len(self._values)
+            self._value_codes[value] = value_code
+            self._values.append(value)
+        for row in rows:
+            self._rows.append(row)
+            self._key_idx.append(key_code)
+            self._value_idx.append(value_code)
+
+    def add_annotations(self, anns):
+        """Add values from Map annotations, as from marshal_annotations()."""
+        for ann in anns:
+            image_id = ann["link"]["parent"]["id"]
+            for key, value in ann.get("values", []):
+                self.add(image_id, key, value)
+
+    def keys(self):
+        """All Keys, in the order they were first seen."""
+        return list(self._keys)
+
+    def _group_by_key(self):
+        """
+        Yield (rows, value codes) for each Key, sorted by row and in the
+        same order as keys().
+        """
+        rows = np.frombuffer(self._rows, dtype=np.int32)
+        key_idx = np.frombuffer(self._key_idx, dtype=np.int32)
+        value_idx = np.frombuffer(self._value_idx, dtype=np.int32)
+        # Sort by key, then by row (stable, so values keep their order)
+        order = np.lexsort((rows, key_idx))
+        rows, key_idx, value_idx = rows[order], key_idx[order], value_idx[order]
+        bounds = np.searchsorted(key_idx, np.arange(len(self._keys) + 1))
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            yield rows[start:end], value_idx[start:end]
+
+    def iter_rows(self, delimiter=",", batch_size=1000):
+        """
+        Yield a list of strings for each row, one per Key.
+
+        Keys with several values on the same Image are joined with delimiter.
+        """
+        arrays = self.to_arrays(mode=MULTI_VALUE_JOIN, delimiter=delimiter)
+        if not arrays:
+            # No Key-Value pairs, but we still need a row for each Image
+            for _ in self.image_ids:
+                yield []
+            return
+        for offset in range(0, len(self.image_ids), batch_size):
+            columns = [arr.slice(offset, batch_size).to_pylist() for arr in arrays]
+            for row in zip(*columns):
+                yield ["" if value is None else value for value in row]
+
+    def to_arrays(self, mode=MULTI_VALUE_JOIN, delimiter=",", infer_types=False):
+        """
+        Return a pyarrow Array for each Key, in the same order as keys().
+
+        Keys with a single value per Image are dictionary<string> columns.
+        With mode "list", Keys that have several values on any Image become
+        list<string> columns. Otherwise values are joined with delimiter.
+        If infer_types, numeric columns are cast to int64 or float64.
+        """
+        if mode not in MULTI_VALUE_MODES:
+            raise ValueError(f"mode must be one of {MULTI_VALUE_MODES}")
+        all_values = pa.array(self._values, type=pa.string())
+        row_count = len(self.image_ids)
+        arrays = []
+        for rows, value_idx in self._group_by_key():
+            # Only include the values used by this Key in its dictionary
+            codes, local_idx = np.unique(value_idx, return_inverse=True)
+            dictionary = all_values.take(pa.array(codes))
+            local_idx = local_idx.astype(np.int32)
+
+            counts = np.bincount(rows, minlength=row_count)
+            if counts.max(initial=0) > 1:
+                offsets = np.zeros(row_count + 1, dtype=np.int32)
+                np.cumsum(counts, out=offsets[1:])
+                array = pa.ListArray.from_arrays(
+                    pa.array(offsets),
+                    dictionary.take(pa.array(local_idx)),
+                    mask=pa.array(counts == 0),
+                )
+                if mode == MULTI_VALUE_JOIN:
+                    array = pc.binary_join(array, delimiter)
+            else:
+                indices = np.full(row_count, -1, dtype=np.int32)
+                indices[rows] = local_idx
+                array = pa.DictionaryArray.from_arrays(
+                    pa.array(indices, mask=indices < 0), dictionary
+                )
+            arrays.append(infer_type(array) if infer_types else array)
+        return arrays
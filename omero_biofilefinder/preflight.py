@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2025 University of Dundee.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Estimate the size of a BFF table before loading it, to choose how to load it.
+
+We only use aggregate queries, so this is quick even for very large
+containers.
+"""
+
+from datetime import datetime
+
+import omero
+from omero.rtypes import unwrap
+
+from . import biofilefinder_settings as settings
+
+# How to load the table
+STRATEGY_ATTACHED = "attached"
+STRATEGY_CSV = "csv"
+STRATEGY_PARQUET = "parquet"
+STRATEGY_EXPORT = "export"
+STRATEGY_GROUP = "group"
+
+# Rough sizes for estimating the csv size: URLs, names and dates in each
+# row and a Key-Value pair.
+ROW_BYTES = 250
+VALUE_BYTES = 20
+
+# Image IDs for each container, as a subquery
+IMAGE_IDS_QUERIES = {
+    "project": """
+        select dil.child.id from DatasetImageLink dil, ProjectDatasetLink pdl
+        where dil.parent.id = pdl.child.id and pdl.parent.id = :id
+        """,
+    "dataset": """
+        select dil.child.id from DatasetImageLink dil where dil.parent.id = :id
+        """,
+    "plate": """
+        select ws.image.id from WellSample ws where ws.well.plate.id = :id
+        """,
+}
+
+# Rows in the table, i.e. an Image in several Datasets is counted twice
+IMAGE_COUNT_QUERIES = {
+    "project": """
+        select count(dil.id) from DatasetImageLink dil, ProjectDatasetLink pdl
+        where dil.parent.id = pdl.child.id and pdl.parent.id = :id
+        """,
+    "dataset": """
+        select count(dil.id) from DatasetImageLink dil where dil.parent.id = :id
+        """,
+    "plate": """
+        select count(ws.id) from WellSample ws where ws.well.plate.id = :id
+        """,
+}
+
+# Links from Images to Map annotations, counted for each row in the table
+MAP_LINK_COUNT_QUERIES = {
+    "project": """
+        select count(ial.id)
+        from ImageAnnotationLink ial, MapAnnotation ann, DatasetImageLink dil,
+            ProjectDatasetLink pdl
+        where ial.child.id = ann.id and ial.parent.id = dil.child.id
+            and dil.parent.id = pdl.child.id and pdl.parent.id = :id
+        """,
+    "dataset": """
+        select count(ial.id)
+        from ImageAnnotationLink ial, MapAnnotation ann, DatasetImageLink dil
+        where ial.child.id = ann.id and ial.parent.id = dil.child.id
+            and dil.parent.id = :id
+        """,
+    "plate": """
+        select count(ial.id)
+        from ImageAnnotationLink ial, MapAnnotation ann, WellSample ws
+        where ial.child.id = ann.id and ial.parent.id = ws.image.id
+            and ws.well.plate.id = :id
+        """,
+}
+
+
+def _projection(conn, query, obj_id):
+    params = omero.sys.ParametersI()
+    params.addId(obj_id)
+    qs = conn.getQueryService()
+    return [unwrap(row) for row in qs.projection(query, params, conn.SERVICE_OPTS)]
+
+
+def estimate(conn, obj_type, obj_id):
+    """
+    Count the Images, Keys and Key-Value pairs in a container.
+
+    Returns a dict with image_count, pair_count, key_counts (most common
+    Keys first), map_link_count (links to Map annotations, for each row),
+    csv_size (estimated bytes) and last_update (datetime of the latest
+    change to Map annotations, or None).
+    """
+    image_count = _projection(conn, IMAGE_COUNT_QUERIES[obj_type], obj_id)[0][0]
+    map_link_count = _projection(conn, MAP_LINK_COUNT_QUERIES[obj_type], obj_id)[0][0]
+
+    image_ids = IMAGE_IDS_QUERIES[obj_type]
+    key_counts = _projection(
+        conn,
+        f"""
+        select mv.name, count(mv.name)
+        from MapAnnotation ann join ann.mapValue mv, ImageAnnotationLink ial
+        where ial.child.id = ann.id and ial.parent.id in ({image_ids})
+        group by mv.name order by count(mv.name) desc
+        """,
+        obj_id,
+    )
+    times = _projection(
+        conn,
+        f"""
+        select max(ann.details.updateEvent.time),
+            max(ial.details.creationEvent.time)
+        from MapAnnotation ann, ImageAnnotationLink ial
+        where ial.child.id = ann.id and ial.parent.id in ({image_ids})
+        """,
+        obj_id,
+    )[0]
+    times = [t for t in times if t is not None]
+    last_update = datetime.fromtimestamp(max(times) / 1000) if times else None
+
+    pair_count = sum(count for _, count in key_counts)
+    csv_size = image_count * (ROW_BYTES + len(key_counts)) + pair_count * VALUE_BYTES
+    return {
+        "image_count": image_count,
+        "pair_count": pair_count,
+        "key_counts": key_counts,
+        "map_link_count": map_link_count,
+        "csv_size": csv_size,
+        "last_update": last_update,
+    }
+
+
+def is_fresh(parquet_ann, preflight):
+    """
+    Is the attached parquet newer than all Map annotations, with a row for
+    every Image and the same Map annotations? parquet_ann is a dict with
+    "created" (datetime), "num_rows" (from the parquet statistics, or None)
+    and "map_link_count" (from the parquet metadata, or None).
+
+    Unlinking or deleting a Map annotation doesn't change any update time,
+    so it is only noticed from the number of links.
+    """
+    last_update = preflight["last_update"]
+    if last_update is not None and parquet_ann["created"] < last_update:
+        return False
+    map_link_count = parquet_ann.get("map_link_count")
+    if map_link_count is not None and map_link_count != preflight["map_link_count"]:
+        return False
+    num_rows = parquet_ann.get("num_rows")
+    return num_rows is None or num_rows == preflight["image_count"]
+
+
+def choose_strategy(
+    preflight, fresh_parquet=False, list_columns=False, can_export=True
+):
+    """
+    Choose the quickest way to load the table that won't time out:
+    a fresh attached parquet file, csv or parquet "on the fly", or an
+    export in the background. If the container is too large to load on
+    the fly and can't be exported (e.g. a Plate), we use the index of its
+    group, which is built in the background.
+    """
+    if fresh_parquet:
+        return STRATEGY_ATTACHED
+    if preflight["image_count"] > settings.ON_THE_FLY_MAX_IMAGES:
+        return STRATEGY_EXPORT if can_export else STRATEGY_GROUP
+    # parquet is smaller to download and is needed for list columns
+    if list_columns or preflight["csv_size"] > settings.CSV_MAX_SIZE * 1024 * 1024:
+        return STRATEGY_PARQUET
+    return STRATEGY_CSV
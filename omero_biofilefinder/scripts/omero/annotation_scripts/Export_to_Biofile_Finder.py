@@ -25,23 +25,403 @@ zip file for download.
 """
 
 import argparse
-import csv
+import json
 import os
-from collections import defaultdict
+from array import array
 from datetime import datetime
 
+import numpy as np
 import omero
 import omero.scripts as scripts
 import omero.util.script_utils as script_utils
 import pyarrow as pa
+import pyarrow.compute as pc
 import pyarrow.parquet as pq
 from omero import ClientError
 from omero.gateway import BlitzGateway
-from omero.rtypes import rlong, robject, rstring
-from pyarrow import csv as pa_csv
+from omero.model import LengthI
+from omero.model.enums import UnitsLength
+from omero.rtypes import rlong, robject, rstring, unwrap
 
 BFF_NAMESPACE = "omero_biofilefinder.parquet"
 
+# NB: The script runs on the OMERO server, where omero_biofilefinder isn't
+# installed, so this is copied from omero_biofilefinder/kvp_accumulator.py
+
+# How to output Keys that have several values on the same Image
+MULTI_VALUE_JOIN = "join"
+MULTI_VALUE_LIST = "list"
+MULTI_VALUE_MODES = (MULTI_VALUE_JOIN, MULTI_VALUE_LIST)
+
+
+def infer_type(array):
+    """
+    Cast string (or list<string>) values to int64 or float64 if possible.
+
+    Values are only cast if they are the same when cast back to strings, so
+    that e.g. zero-padded IDs like "007" stay as strings, as they are in csv.
+    """
+    is_list = pa.types.is_list(array.type)
+    if is_list:
+        values = pc.list_flatten(array)
+    elif pa.types.is_dictionary(array.type):
+        values = array.dictionary
+    else:
+        values = array
+    for value_type in (pa.int64(), pa.float64()):
+        try:
+            cast_values = values.cast(value_type)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            continue
+        if not pc.all(pc.equal(cast_values.cast(pa.string()), values)).as_py():
+            return array
+        return array.cast(pa.list_(value_type) if is_list else value_type)
+    return array
+
+
+class KeyValueAccumulator:
+    """
+    Collects Key-Value pairs for a list of Images as flat columns.
+
+    Keys and values are interned: each distinct string is stored once and
+    each Key-Value pair is stored as (row, key code, value code) in three
+    int32 arrays. This uses much less memory than a dict of lists of
+    strings for every Image. Columns are built with numpy and returned as
+    pyarrow dictionary arrays, without creating Python objects per row.
+    """
+
+    def __init__(self):
+        self.image_ids = []
+        self._rows_by_iid = {}
+        self._keys = []
+        self._key_codes = {}
+        self._values = []
+        self._value_codes = {}
+        self._rows = array("i")
+        self._key_idx = array("i")
+        self._value_idx = array("i")
+
+    def __len__(self):
+        return len(self.image_ids)
+
+    def add_image(self, image_id):
+        """
+        Add a row for the Image, in the order that rows are output.
+
+        An Image can have several rows, e.g. if it is in several Datasets.
+        """
+        row = len(self.image_ids)
+        self._rows_by_iid.setdefault(image_id, []).append(row)
+        self.image_ids.append(image_id)
+        return row
+
+    def add(self, image_id, key, value):
+        """Add a Key-Value pair to an Image already added with add_image()."""
+        rows = self._rows_by_iid.get(image_id)
+        if rows is None:
+            return
+        key_code = self._key_codes.get(key)
+        if key_code is None:
+            key_code = len(self._keys)
+            self._key_codes[key] = key_code
+            self._keys.append(key)
+        value_code = self._value_codes.get(value)
+        if value_code is None:
+            value_code = len(self._values)
+            self._value_codes[value] = value_code
+            self._values.append(value)
+        for row in rows:
+            self._rows.append(row)
+            self._key_idx.append(key_code)
+            self._value_idx.append(value_code)
+
+    def add_annotations(self, anns):
+        """Add values from Map annotations, as from marshal_annotations()."""
+        for ann in anns:
+            image_id = ann["link"]["parent"]["id"]
+            for key, value in ann.get("values", []):
+                self.add(image_id, key, value)
+
+    def keys(self):
+        """All Keys, in the order they were first seen."""
+        return list(self._keys)
+
+    def _group_by_key(self):
+        """
+        Yield (rows, value codes) for each Key, sorted by row and in the
+        same order as keys().
+        """
+        rows = np.frombuffer(self._rows, dtype=np.int32)
+        key_idx = np.frombuffer(self._key_idx, dtype=np.int32)
+        value_idx = np.frombuffer(self._value_idx, dtype=np.int32)
+        # Sort by key, then by row (stable, so values keep their order)
+        order = np.lexsort((rows, key_idx))
+        rows, key_idx, value_idx = rows[order], key_idx[order], value_idx[order]
+        bounds = np.searchsorted(key_idx, np.arange(len(self._keys) + 1))
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            yield rows[start:end], value_idx[start:end]
+
+    def iter_rows(self, delimiter=",", batch_size=1000):
+        """
+        Yield a list of strings for each row, one per Key.
+
+        Keys with several values on the same Image are joined with delimiter.
+        """
+        arrays = self.to_arrays(mode=MULTI_VALUE_JOIN, delimiter=delimiter)
+        if not arrays:
+            # No Key-Value pairs, but we still need a row for each Image
+            for _ in self.image_ids:
+                yield []
+            return
+        for offset in range(0, len(self.image_ids), batch_size):
+            columns = [arr.slice(offset, batch_size).to_pylist() for arr in arrays]
+            for row in zip(*columns):
+                yield ["" if value is None else value for value in row]
+
+    def to_arrays(self, mode=MULTI_VALUE_JOIN, delimiter=",", infer_types=False):
+        """
+        Return a pyarrow Array for each Key, in the same order as keys().
+
+        Keys with a single value per Image are dictionary<string> columns.
+        With mode "list", Keys that have several values on any Image become
+        list<string> columns. Otherwise values are joined with delimiter.
+        If infer_types, numeric columns are cast to int64 or float64.
+        """
+        if mode not in MULTI_VALUE_MODES:
+            raise ValueError(f"mode must be one of {MULTI_VALUE_MODES}")
+        all_values = pa.array(self._values, type=pa.string())
+        row_count = len(self.image_ids)
+        arrays = []
+        for rows, value_idx in self._group_by_key():
+            # Only include the values used by this Key in its dictionary
+            codes, local_idx = np.unique(value_idx, return_inverse=True)
+            dictionary = all_values.take(pa.array(codes))
+            local_idx = local_idx.astype(np.int32)
+
+            counts = np.bincount(rows, minlength=row_count)
+            if counts.max(initial=0) > 1:
+                offsets = np.zeros(row_count + 1, dtype=np.int32)
+                np.cumsum(counts, out=offsets[1:])
+                array = pa.ListArray.from_arrays(
+                    pa.array(offsets),
+                    dictionary.take(pa.array(local_idx)),
+                    mask=pa.array(counts == 0),
+                )
+                if mode == MULTI_VALUE_JOIN:
+                    array = pc.binary_join(array, delimiter)
+            else:
+                indices = np.full(row_count, -1, dtype=np.int32)
+                indices[rows] = local_idx
+                array = pa.DictionaryArray.from_arrays(
+                    pa.array(indices, mask=indices < 0), dictionary
+                )
+            arrays.append(infer_type(array) if infer_types else array)
+        return arrays
+
+
+# Copied from omero_biofilefinder/table_stats.py
+STATS_KEY = b"omero_biofilefinder.stats"
+# Only store counts for the most common values of each column
+MAX_VALUE_COUNTS = 100
+# Columns added for every Image, that aren't from Key-Value pairs
+IMAGE_COLUMNS = ("File Path", "File Name", "Dataset", "Well", "Thumbnail", "Uploaded")
+# Links from Images to Map annotations when the table was exported, to
+# check that it is up to date
+MAP_LINK_COUNT_KEY = b"omero_biofilefinder.map_link_count"
+
+
+def column_stats(column, value_counts=True):
+    """
+    Null count, distinct count, min/max and top value counts of a column.
+
+    Use value_counts=False for columns of (mostly) unique values, e.g. URLs,
+    where counting each value is slow and the top counts are all 1.
+    """
+    stats = {"null_count": column.null_count}
+    if pa.types.is_list(column.type):
+        column = pc.list_flatten(column)
+    values = pc.drop_null(column)
+    if not value_counts:
+        stats["distinct_count"] = pc.count_distinct(values).as_py()
+        try:
+            min_max = pc.min_max(values).as_py()
+            stats["min"], stats["max"] = min_max["min"], min_max["max"]
+        except (pa.ArrowNotImplementedError, pa.ArrowTypeError):
+            pass
+        return stats
+    counts = pc.value_counts(values)
+    distinct = counts.field("values")
+    if pa.types.is_dictionary(distinct.type):
+        distinct = distinct.dictionary_decode()
+    stats["distinct_count"] = len(distinct)
+    if len(counts) > 0:
+        order = pc.array_sort_indices(counts.field("counts"), order="descending")
+        top = counts.take(order[:MAX_VALUE_COUNTS])
+        stats["value_counts"] = [
+            [v, c]
+            for v, c in zip(
+                distinct.take(order[:MAX_VALUE_COUNTS]).to_pylist(),
+                top.field("counts").to_pylist(),
+            )
+        ]
+    try:
+        # min/max of the distinct values is quicker than of all values
+        min_max = pc.min_max(distinct).as_py()
+        stats["min"], stats["max"] = min_max["min"], min_max["max"]
+    except (pa.ArrowNotImplementedError, pa.ArrowTypeError):
+        pass
+    return stats
+
+
+def compute_stats(table):
+    return {
+        "num_rows": table.num_rows,
+        "columns": {
+            name: column_stats(table.column(name), name not in IMAGE_COLUMNS)
+            for name in table.column_names
+        },
+    }
+
+
+def with_stats(table):
+    """Return the table with statistics added to the schema metadata."""
+    metadata = dict(table.schema.metadata or {})
+    metadata[STATS_KEY] = json.dumps(compute_stats(table), default=str).encode()
+    return table.replace_schema_metadata(metadata)
+
+
+# Copied from omero_biofilefinder/image_metadata.py
+# Column names for each set of extra columns
+EXTRA_COLUMNS = {
+    "dimensions": ["Size X", "Size Y", "Size Z", "Size C", "Size T"],
+    "pixel_size": ["Pixel Size X (µm)", "Pixel Size Y (µm)", "Pixel Size Z (µm)"],
+    "channels": ["Channels"],
+    "acquisition_date": ["Acquisition Date"],
+    "tags": ["Tags"],
+    "roi_count": ["ROI Count"],
+}
+
+QUERIES = {
+    "dimensions": """
+        select pix.image.id, pix.sizeX, pix.sizeY, pix.sizeZ, pix.sizeC, pix.sizeT
+        from Pixels pix where pix.image.id in (:ids)
+        """,
+    # Pixels objects, to convert the sizes to micrometres with their units
+    "pixel_size": """
+        select pix from Pixels pix where pix.image.id in (:ids)
+        """,
+    "channels": """
+        select pix.image.id, lc.name
+        from Pixels pix join pix.channels ch join ch.logicalChannel lc
+        where pix.image.id in (:ids) order by index(ch)
+        """,
+    "acquisition_date": """
+        select img.id, img.acquisitionDate from Image img where img.id in (:ids)
+        """,
+    "tags": """
+        select link.parent.id, tag.textValue
+        from ImageAnnotationLink link, TagAnnotation tag
+        where link.child.id = tag.id and link.parent.id in (:ids)
+        order by tag.textValue
+        """,
+    "roi_count": """
+        select roi.image.id, count(roi.id) from Roi roi
+        where roi.image.id in (:ids) group by roi.image.id
+        """,
+}
+
+# Columns with several values per Image
+LIST_COLUMNS = ("channels", "tags")
+
+
+def parse_extra_columns(names):
+    """Return the valid names from a list or comma-separated string."""
+    if isinstance(names, str):
+        names = names.split(",")
+    names = [name.strip().lower() for name in names]
+    return [name for name in EXTRA_COLUMNS if name in names]
+
+
+def _pixel_sizes(pixels_list):
+    """Rows of Image ID and pixel sizes in micrometres, from Pixels objects."""
+    rows = []
+    for pixels in pixels_list:
+        row = [pixels.getImage().getId().getValue()]
+        for size in [
+            pixels.getPhysicalSizeX(),
+            pixels.getPhysicalSizeY(),
+            pixels.getPhysicalSizeZ(),
+        ]:
+            if size is not None:
+                size = LengthI(size, UnitsLength.MICROMETER).getValue()
+            row.append(size)
+        rows.append(row)
+    return rows
+
+
+def load_image_metadata(conn, image_ids, extra_columns, batch_size=1000):
+    """
+    Load extra columns for the Images.
+
+    Returns {column name: [value for each Image in image_ids]}. Values of
+    "Channels" and "Tags" are lists of strings.
+    """
+    qs = conn.getQueryService()
+    # An Image can be in several rows, e.g. if it is in several Datasets
+    rows_by_iid = {}
+    for row, iid in enumerate(image_ids):
+        rows_by_iid.setdefault(iid, []).append(row)
+    unique_ids = list(rows_by_iid)
+    columns = {}
+    for name in extra_columns:
+        col_names = EXTRA_COLUMNS[name]
+        is_list = name in LIST_COLUMNS
+        values = [
+            [[] if is_list else None for _ in image_ids] for _ in range(len(col_names))
+        ]
+        for i in range(0, len(unique_ids), batch_size):
+            params = omero.sys.ParametersI()
+            params.addIds(unique_ids[i : i + batch_size])
+            if name == "pixel_size":
+                result = qs.findAllByQuery(QUERIES[name], params, conn.SERVICE_OPTS)
+                result = _pixel_sizes(result)
+            else:
+                result = qs.projection(QUERIES[name], params, conn.SERVICE_OPTS)
+                result = [unwrap(row) for row in result]
+            for row in result:
+                for col, value in enumerate(row[1:]):
+                    if name == "acquisition_date" and value is not None:
+                        value = datetime.fromtimestamp(value / 1000).strftime(
+                            "%Y-%m-%d %H:%M:%S"
+                        )
+                    for idx in rows_by_iid[row[0]]:
+                        if not is_list:
+                            values[col][idx] = value
+                        elif value is not None:
+                            values[col][idx].append(value)
+        columns.update(zip(col_names, values))
+    return columns
+
+
+def metadata_arrays(columns, list_columns=False, delimiter=","):
+    """
+    Return a pyarrow Array for each column from load_image_metadata().
+
+    Lists of values are list<string> if list_columns, otherwise they are
+    joined with delimiter.
+    """
+    arrays = []
+    for values in columns.values():
+        if not any(isinstance(value, list) for value in values):
+            arrays.append(pa.array(values))
+        elif list_columns:
+            values = [value or None for value in values]
+            arrays.append(pa.array(values, type=pa.list_(pa.string())))
+        else:
+            values = [delimiter.join(value) if value else None for value in values]
+            arrays.append(pa.array(values, type=pa.string()))
+    return arrays
+
 
 def marshal_annotations(
     conn,
@@ -121,72 +501,103 @@ def marshal_annotations(
     return annotations
 
 
-def process_dataset_to_csv(conn, dataset, base_url):
+def process_dataset_to_parquet(conn, dataset, base_url, mode, delimiter, extra_columns):
     print(f"Processing dataset {dataset.id}")
-    export_file = f"Dataset:{dataset.id}_bff.csv"
+    export_file = f"Dataset:{dataset.id}_bff.parquet"
     if os.path.exists(export_file):
         print(f"File {export_file} already exists, skipping...")
         return export_file
-    image_ids = []
-    images_by_id = {}
-    for image in dataset.listChildren():
-        image_ids.append(image.id)
-        images_by_id[image.id] = {
-            "dataset_name": dataset.getName(),
-            "name": image.getName(),
-            "date": image.creationEventDate().strftime("%Y-%m-%d %H:%M:%S.%Z"),
-        }
-
-    # Collect all the Keys...
-    keys = set()
 
-    # Add values to dict {image_id: {key: [list, of, values]}}
-    kvp = {}
+    accumulator = KeyValueAccumulator()
+    names = []
+    dates = []
+    for image in dataset.listChildren():
+        accumulator.add_image(image.id)
+        names.append(image.getName())
+        dates.append(image.creationEventDate().strftime("%Y-%m-%d %H:%M:%S.%Z"))
+    image_ids = accumulator.image_ids
 
+    map_link_count = 0
     batch_size = 100
     for i in range(0, len(image_ids), batch_size):
         print(f"Processing {i} to {i + batch_size}")
         batch_ids = image_ids[i : i + batch_size]
         anns = marshal_annotations(conn, image_ids=batch_ids, ann_type="map")
-        for ann in anns:
-            image_id = ann["link"]["parent"]["id"]
-            if image_id not in kvp:
-                kvp[image_id] = defaultdict(list)
-            for key_val in ann["values"]:
-                key = key_val[0]
-                value = key_val[1]
-                kvp[image_id][key].append(value)
-                keys.add(key)
+        accumulator.add_annotations(anns)
+        map_link_count += len(anns)
+
+    extra = load_image_metadata(conn, image_ids, extra_columns)
 
     column_names = ["File Path", "File Name", "Dataset", "Thumbnail"]
-    column_names.extend(list(keys))
+    column_names.extend(accumulator.keys())
+    column_names.extend(extra.keys())
     column_names.append("Uploaded")
 
-    # write csv e.g "Dataset:1_bff.csv"...
-    with open(export_file, mode="w") as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(column_names)
-        for image_id in image_ids:
-            values = kvp.get(image_id, {})
-            thumb_url = f"{base_url}webgateway/render_thumbnail/{image_id}"
-            image = conn.getObject("Image", image_id)
-            # we end url with .png so that BFF enables open-with "Browser"
-            image_url = f"{base_url}webclient/?show=image-{image_id}&_=.png"
-            img_info = images_by_id.get(image_id)
-            row = [
-                image_url,
-                img_info.get("name") if img_info else "Not Found",
-                img_info.get("dataset_name") if img_info else "Not Found",
-                thumb_url,
-            ]
-            for key in keys:
-                row.append(",".join(values.get(key, [])))
-            row.append(image.creationEventDate().strftime("%Y-%m-%d %H:%M:%S.%Z"))
-            writer.writerow(row)
+    columns = [
+        # we end url with .png so that BFF enables open-with "Browser"
+        [f"{base_url}webclient/?show=image-{iid}&_=.png" for iid in image_ids],
+        names,
+        [dataset.getName()] * len(image_ids),
+        [f"{base_url}webgateway/render_thumbnail/{iid}" for iid in image_ids],
+    ]
+    columns.extend(
+        accumulator.to_arrays(mode=mode, delimiter=delimiter, infer_types=True)
+    )
+    columns.extend(
+        metadata_arrays(
+            extra, list_columns=mode == MULTI_VALUE_LIST, delimiter=delimiter
+        )
+    )
+    columns.append(dates)
+
+    # write parquet e.g "Dataset:1_bff.parquet"...
+    metadata = {MAP_LINK_COUNT_KEY: str(map_link_count).encode()}
+    table = pa.table(columns, names=column_names, metadata=metadata)
+    pq.write_table(table, export_file)
 
     return export_file
 
 
+def unify_column_types(tables):
+    """
+    Cast columns that have different types in different tables to a common
+    type, so that the tables can be concatenated. E.g. a Key may have
+    numeric values in one Dataset and text or several values in another.
+    """
+    types_by_name = {}
+    for table in tables:
+        for field in table.schema:
+            types_by_name.setdefault(field.name, set()).add(field.type)
+
+    target_types = {}
+    for name, types in types_by_name.items():
+        if len(types) < 2:
+            continue
+        is_list = any(pa.types.is_list(t) for t in types)
+        value_types = {t.value_type if pa.types.is_list(t) else t for t in types}
+        if value_types <= {pa.int64()}:
+            value_type = pa.int64()
+        elif value_types <= {pa.int64(), pa.float64()}:
+            value_type = pa.float64()
+        else:
+            value_type = pa.string()
+        target_types[name] = pa.list_(value_type) if is_list else value_type
+
+    unified = []
+    for table in tables:
+        for idx, field in enumerate(table.schema):
+            target = target_types.get(field.name)
+            if target is None or field.type == target:
+                continue
+            column = table.column(idx)
+            if pa.types.is_list(target) and not pa.types.is_list(field.type):
+                values = [None if v is None else [v] for v in column.to_pylist()]
+                column = pa.array(values, type=pa.list_(field.type))
+            table = table.set_column(idx, field.name, column.cast(target))
+        unified.append(table)
+    return unified
+
+
 def export_to_bff(conn, script_params):
     """
     Export image Key-Value pairs to a csv or parquet file for Biofile Finder
@@ -194,7 +605,10 @@ def export_to_bff(conn, script_params):
 
     max_datasets = 500
     base_url = script_params["Base_URL"]
-    csv_names = []
+    mode = script_params.get("Multi_Value_Mode", MULTI_VALUE_JOIN).lower()
+    delimiter = script_params.get("Value_Delimiter", ",")
+    extra_columns = parse_extra_columns(script_params.get("Extra_Columns", []))
+    pq_names = []
 
     conn.SERVICE_OPTS.setOmeroGroup(-1)
     if script_params["Data_Type"] == "Project":
@@ -206,21 +620,36 @@ def export_to_bff(conn, script_params):
             datasets.sort(key=lambda x: x.id)
             datasets = datasets[:max_datasets]
             for dataset in datasets:
-                csv_name = process_dataset_to_csv(conn, dataset, base_url)
-                csv_names.append(csv_name)
+                pq_name = process_dataset_to_parquet(
+                    conn, dataset, base_url, mode, delimiter, extra_columns
+                )
+                pq_names.append(pq_name)
     elif script_params["Data_Type"] == "Dataset":
         parent = conn.getObject("Dataset", script_params["IDs"][0])
         group_id = parent.getDetails().group.id.val
         conn.SERVICE_OPTS.setOmeroGroup(group_id)
         for obj_id in script_params["IDs"]:
             dataset = conn.getObject("Dataset", obj_id)
-            csv_name = process_dataset_to_csv(conn, dataset, base_url)
-            csv_names.append(csv_name)
+            pq_name = process_dataset_to_parquet(
+                conn, dataset, base_url, mode, delimiter, extra_columns
+            )
+            pq_names.append(pq_name)
 
-    # Finally, combine the csv files into a single file
-    data_tables = [pa_csv.read_csv(csv_name) for csv_name in csv_names]
+    # Finally, combine the parquet files into a single file
+    data_tables = [pq.read_table(pq_name) for pq_name in pq_names]
+    # Files exported by older versions of the script have no link count
+    link_counts = [
+        (table.schema.metadata or {}).get(MAP_LINK_COUNT_KEY) for table in data_tables
+    ]
+    data_tables = unify_column_types(data_tables)
     combined_table = pa.concat_tables(data_tables, promote_options="default")
     combined_table.combine_chunks()
+    metadata = {}
+    if None not in link_counts:
+        map_link_count = sum(int(count) for count in link_counts)
+        metadata[MAP_LINK_COUNT_KEY] = str(map_link_count).encode()
+    combined_table = combined_table.replace_schema_metadata(metadata)
+    combined_table = with_stats(combined_table)
 
     print("combined_table", combined_table)
     # Write the combined table back to a Parquet file
@@ -276,6 +705,31 @@ def run_script():
             ),
             default="/",
         ),
+        scripts.String(
+            "Multi_Value_Mode",
+            optional=True,
+            grouping="4",
+            description=(
+                "For Keys with several values on the same Image, 'Join' the "
+                "values into one string or store them as a 'List' column"
+            ),
+            values=[rstring("Join"), rstring("List")],
+            default="Join",
+        ),
+        scripts.String(
+            "Value_Delimiter",
+            optional=True,
+            grouping="5",
+            description="Delimiter to 'Join' several values for the same Key",
+            default=",",
+        ),
+        scripts.List(
+            "Extra_Columns",
+            optional=True,
+            grouping="6",
+            description="Image metadata to add as columns",
+            values=[rstring(name) for name in EXTRA_COLUMNS],
+        ).ofType(rstring("")),
         authors=["William Moore", "OME Team"],
         institutions=["University of Dundee"],
     )
@@ -325,6 +779,25 @@ if __name__ == "__main__":
                 ),
                 default="/",
             )
+            parser.add_argument(
+                "--multi-value-mode",
+                choices=MULTI_VALUE_MODES,
+                default=MULTI_VALUE_JOIN,
+                help="'join' several values for a Key or store them as a 'list'",
+            )
+            parser.add_argument(
+                "--value-delimiter",
+                default=",",
+                help="Delimiter to join several values for the same Key",
+            )
+            parser.add_argument(
+                "--extra-columns",
+                default="",
+                help=(
+                    "Comma-separated Image metadata to add as columns, e.g. "
+                    f"'dimensions,tags'. Options: {', '.join(EXTRA_COLUMNS)}"
+                ),
+            )
             args = parser.parse_args()
             dtype, obj_id = args.target.split(":")
             obj_ids = [int(i) for i in obj_id.split(",")]
@@ -334,6 +807,9 @@ if __name__ == "__main__":
                 "Data_Type": dtype,
                 "IDs": obj_ids,
                 "Base_URL": args.base_url,
+                "Multi_Value_Mode": args.multi_value_mode,
+                "Value_Delimiter": args.value_delimiter,
+                "Extra_Columns": parse_extra_columns(args.extra_columns),
             }
             file_annotation, message = export_to_bff(conn, script_params)
             print("Message: %s" % message)
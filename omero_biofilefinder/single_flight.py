@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2025 University of Dundee.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Coalescing of identical concurrent requests for expensive exports.
+
+When a BFF link is shared, many browsers can request the same export at
+once. Only the first request (the "leader") does the work, and the others
+wait for it and get a copy of the same response. The number of exports
+running at once in each web worker is limited, and requests beyond that
+limit get a "503 Service Unavailable" with a Retry-After header.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.http import HttpResponse
+
+from . import biofilefinder_settings as settings
+from .compression import negotiate_encoding
+from .table_cache import remove_unlocked
+
+_lock = threading.Lock()
+# {key: _Flight} for the exports currently running in this process
+_flights = {}
+_export_slots = threading.BoundedSemaphore(max(1, settings.MAX_CONCURRENT_EXPORTS))
+
+
+class ExportsBusy(Exception):
+    """Raised when too many exports are already running."""
+
+
+class _Flight:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def busy_response():
+    response = HttpResponse(
+        "Too many exports running. Please try again later.",
+        status=503,
+        content_type="text/plain",
+    )
+    response["Retry-After"] = str(settings.RETRY_AFTER)
+    return response
+
+
+def _to_result(response):
+    """Copy what we need to rebuild an HttpResponse for each request."""
+    return {
+        "status": response.status_code,
+        "headers": dict(response.items()),
+        "content": response.content,
+    }
+
+
+def _from_result(result):
+    response = HttpResponse(result["content"], status=result["status"])
+    for name, value in result["headers"].items():
+        response[name] = value
+    return response
+
+
+def _remove_old_results(lock_dir):
+    """
+    Delete result files that no waiting worker can still use.
+
+    Workers only use a result written after they started waiting, and they
+    give up after SINGLE_FLIGHT_TIMEOUT, so older results are never read.
+    Old lock files are removed too, unless another worker holds them.
+    """
+    too_old = time.time() - 2 * settings.SINGLE_FLIGHT_TIMEOUT
+    with os.scandir(lock_dir) as entries:
+        for entry in entries:
+            try:
+                if entry.stat().st_mtime >= too_old:
+                    continue
+                if entry.name.endswith(".lock"):
+                    remove_unlocked(entry.path)
+                else:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                # Removed by another worker
+                pass
+
+
+@contextmanager
+def _locked_file(lock_path, started):
+    """
+    Hold an exclusive lock on lock_path, or raise ExportsBusy if we waited
+    for it for more than SINGLE_FLIGHT_TIMEOUT.
+    """
+    while True:
+        with open(lock_path, "a") as lock_file:
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.time() - started > settings.SINGLE_FLIGHT_TIMEOUT:
+                        raise ExportsBusy()
+                    time.sleep(0.5)
+            try:
+                # _remove_old_results() may have removed the file before we
+                # locked it, and other workers would lock a new file
+                try:
+                    locked = os.fstat(lock_file.fileno()).st_ino
+                    is_current = locked == os.stat(lock_path).st_ino
+                except FileNotFoundError:
+                    is_current = False
+                if is_current:
+                    # So that _remove_old_results() keeps it
+                    os.utime(lock_path)
+                    yield
+                    return
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _run_with_file_lock(key, func):
+    """
+    Run func() while holding a lock file shared with other web workers.
+
+    If another worker produced the result while we waited for the lock, we
+    use that result instead of running func() again. The result is kept in
+    the lock directory for the other waiting workers and removed later by
+    _remove_old_results().
+    """
+    lock_dir = settings.SINGLE_FLIGHT_DIR
+    os.makedirs(lock_dir, exist_ok=True)
+    _remove_old_results(lock_dir)
+    name = hashlib.sha256(key.encode()).hexdigest()
+    lock_path = os.path.join(lock_dir, f"{name}.lock")
+    meta_path = os.path.join(lock_dir, f"{name}.json")
+    content_path = os.path.join(lock_dir, f"{name}.content")
+
+    started = time.time()
+    with _locked_file(lock_path, started):
+        # Did another worker finish while we were waiting?
+        if os.path.exists(meta_path) and os.path.getmtime(meta_path) >= started:
+            with open(meta_path) as f:
+                result = json.load(f)
+            with open(content_path, "rb") as f:
+                result["content"] = f.read()
+            return result
+
+        result = func()
+        with open(content_path + ".tmp", "wb") as f:
+            f.write(result["content"])
+        os.replace(content_path + ".tmp", content_path)
+        meta = {"status": result["status"], "headers": result["headers"]}
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        return result
+
+
+@contextmanager
+def export_slot():
+    """
+    Hold one of the omero.web.bff.max_concurrent_exports slots while
+    exporting, or raise ExportsBusy if they are all in use.
+    """
+    if not _export_slots.acquire(blocking=False):
+        raise ExportsBusy()
+    try:
+        yield
+    finally:
+        _export_slots.release()
+
+
+def _run_export(view_func, request, *args, **kwargs):
+    with export_slot():
+        return _to_result(view_func(request, *args, **kwargs))
+
+
+def _flight_key(request, conn):
+    # Results depend on the user's permissions, the host in absolute URLs
+    # and the compression accepted by the client
+    return ":".join(
+        [
+            str(conn.getUserId()),
+            str(conn.SERVICE_OPTS.getOmeroGroup()),
+            request.get_host(),
+            request.get_full_path(),
+            request.headers.get("Range", ""),
+            negotiate_encoding(request) or "identity",
+        ]
+    )
+
+
+def single_flight(view_func):
+    """
+    Decorator for expensive export views, used inside @login_required().
+
+    Identical concurrent requests (same user, group and URL) share a single
+    call to the view. The number of calls running at once is limited by
+    omero.web.bff.max_concurrent_exports.
+    """
+
+    @wraps(view_func)
+    def wrapper(request, *args, conn=None, **kwargs):
+        key = _flight_key(request, conn)
+
+        with _lock:
+            flight = _flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = _Flight()
+                _flights[key] = flight
+
+        if not is_leader:
+            if not flight.done.wait(settings.SINGLE_FLIGHT_TIMEOUT):
+                return busy_response()
+            if flight.error is not None:
+                if isinstance(flight.error, ExportsBusy):
+                    return busy_response()
+                raise flight.error
+            return _from_result(flight.result)
+
+        def run():
+            return _run_export(view_func, request, *args, conn=conn, **kwargs)
+
+        try:
+            try:
+                if settings.SINGLE_FLIGHT_DIR:
+                    flight.result = _run_with_file_lock(key, run)
+                else:
+                    flight.result = run()
+            finally:
+                # Share any error with the waiting requests too
+                flight.error = sys.exc_info()[1]
+                with _lock:
+                    _flights.pop(key, None)
+                flight.done.set()
+        except ExportsBusy:
+            return busy_response()
+        return _from_result(flight.result)
+
+    return wrapper
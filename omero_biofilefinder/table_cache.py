@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2025 University of Dundee.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Cache of BFF tables as parquet files on local disk."""
+
+import fcntl
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import pyarrow.parquet as pq
+
+from . import biofilefinder_settings as settings
+
+_lock = threading.Lock()
+# {path: [Lock, number of threads using it]} for the paths being written
+_path_locks = {}
+
+
+@contextmanager
+def path_lock(path):
+    """
+    Hold a lock for the path, e.g. while building or downloading the file,
+    so that only one thread at a time writes it. Locks are forgotten once
+    no thread is using them.
+    """
+    with _lock:
+        entry = _path_locks.setdefault(path, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _path_locks[path]
+
+
+def get_cache_dir(name):
+    """Return a sub-directory of omero.web.bff.cache_dir, creating it if needed."""
+    cache_dir = settings.CACHE_DIR or os.path.join(
+        tempfile.gettempdir(), "omero_biofilefinder"
+    )
+    path = os.path.join(cache_dir, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def table_path(key):
+    """Path of the cached parquet file for the key, a list of strings."""
+    name = hashlib.sha256(":".join(key).encode()).hexdigest()
+    return os.path.join(get_cache_dir("tables"), f"{name}.parquet")
+
+
+def is_fresh(path, max_age=None):
+    if max_age is None:
+        max_age = settings.CACHE_TTL
+    return os.path.exists(path) and time.time() - os.path.getmtime(path) < max_age
+
+
+def remove_unlocked(lock_path):
+    """
+    Delete a lock file unless another thread or process holds it.
+
+    Returns True if the file was deleted.
+    """
+    try:
+        with open(lock_path, "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            try:
+                os.remove(lock_path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    except FileNotFoundError:
+        # Removed by another process
+        return False
+    return True
+
+
+def remove_old_tables(max_age=None):
+    """
+    Delete the cached tables, and their lock and temporary files, that are
+    more than twice max_age seconds old (default is omero.web.bff.cache_ttl).
+    Those tables are never used again, as they would be rebuilt.
+    """
+    if max_age is None:
+        max_age = settings.CACHE_TTL
+    too_old = time.time() - 2 * max_age
+    with os.scandir(get_cache_dir("tables")) as entries:
+        for entry in entries:
+            try:
+                if entry.stat().st_mtime >= too_old:
+                    continue
+                if entry.name.endswith(".lock"):
+                    remove_unlocked(entry.path)
+                else:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                # Removed by another process
+                pass
+
+
+def get_table_path(key, build_table, max_age=None):
+    """
+    Return the path to a cached parquet file for the key.
+
+    If the file is missing or older than max_age seconds (default is
+    omero.web.bff.cache_ttl), build_table() is called to create a new
+    pyarrow Table, which is written to the cache. Each table is only built
+    by one thread of one web worker at a time, and the others wait for it.
+    Old tables are deleted when a table is built, so the cache doesn't grow
+    without limit.
+    """
+    path = table_path(key)
+    if is_fresh(path, max_age):
+        return path
+
+    remove_old_tables(max_age)
+
+    with path_lock(path), open(f"{path}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            # Another thread or worker may have built the table while we waited
+            if not is_fresh(path, max_age):
+                table = build_table()
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                pq.write_table(table, tmp_path)
+                os.replace(tmp_path, path)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return path
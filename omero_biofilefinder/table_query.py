@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2025 University of Dundee.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Filter, sort, page and count values of BFF tables stored as parquet."""
+
+import json
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+MAX_LIMIT = 10000
+ARROW_STREAM_TYPE = "application/vnd.apache.arrow.stream"
+
+
+class QueryError(ValueError):
+    """Raised for invalid query parameters, e.g. an unknown column."""
+
+
+def parse_filters(filters):
+    """
+    Parse filters from JSON e.g. '{"Gene": ["CDC20", "ANLN"], "Count": [3]}'
+
+    Rows must match one of the values for every column.
+    """
+    if not filters:
+        return {}
+    try:
+        filters = json.loads(filters)
+    except ValueError:
+        raise QueryError("filters must be JSON")
+    if not isinstance(filters, dict):
+        raise QueryError('filters must be e.g. {"column": ["value"]}')
+    return {
+        col: values if isinstance(values, list) else [values]
+        for col, values in filters.items()
+    }
+
+
+def _check_column(schema, name):
+    if name not in schema.names:
+        raise QueryError(f"Column not found: {name}")
+    return schema.field(name).type
+
+
+def _value_set(col_type, values):
+    if pa.types.is_list(col_type) or pa.types.is_dictionary(col_type):
+        col_type = col_type.value_type
+    try:
+        return pa.array(values).cast(col_type)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+        raise QueryError(f"Invalid values for {col_type} column: {values}")
+
+
+def _split_filters(schema, filters):
+    """
+    Return an Expression for filters on scalar columns (applied while the
+    parquet file is scanned) and the filters on list columns.
+    """
+    expression = None
+    list_filters = {}
+    for col, values in filters.items():
+        col_type = _check_column(schema, col)
+        value_set = _value_set(col_type, values)
+        if pa.types.is_list(col_type):
+            list_filters[col] = value_set
+            continue
+        expr = ds.field(col).isin(value_set)
+        expression = expr if expression is None else expression & expr
+    return expression, list_filters
+
+
+def _filter_list_columns(table, list_filters):
+    for col, value_set in list_filters.items():
+        column = table.column(col).combine_chunks()
+        hits = pc.is_in(pc.list_flatten(column), value_set=value_set)
+        parents = pc.filter(pc.list_parent_indices(column), hits)
+        table = table.take(pc.unique(parents))
+    return table
+
+
+def _scan(path, filters, columns):
+    dataset = ds.dataset(path, format="parquet")
+    expression, list_filters = _split_filters(dataset.schema, filters)
+    for col in columns or []:
+        _check_column(dataset.schema, col)
+    return dataset, expression, list_filters
+
+
+def query_rows(path, filters=None, sort=None, offset=0, limit=100, columns=None):
+    """
+    Return a page of rows from the parquet file and the total number of rows
+    that match the filters.
+
+    sort is a column name, with a "-" prefix for descending order.
+    columns is a list of the columns to return (default is all columns).
+    """
+    filters = filters or {}
+    if offset < 0 or limit < 0:
+        raise QueryError("offset and limit must be positive")
+    limit = min(limit, MAX_LIMIT)
+
+    dataset, expression, list_filters = _scan(path, filters, columns)
+    sort_order = "ascending"
+    if sort is not None and sort.startswith("-"):
+        sort, sort_order = sort[1:], "descending"
+    if sort is not None and pa.types.is_list(_check_column(dataset.schema, sort)):
+        raise QueryError(f"Can't sort by list column: {sort}")
+
+    scan_columns = None
+    if columns:
+        scan_columns = list(dict.fromkeys(columns + list(list_filters)))
+        if sort is not None and sort not in scan_columns:
+            scan_columns.append(sort)
+
+    if not list_filters and sort is None:
+        # Only read as many rows as we need
+        scanner = dataset.scanner(filter=expression, columns=scan_columns)
+        total_count = scanner.count_rows()
+        table = scanner.head(offset + limit).slice(offset)
+    else:
+        table = dataset.to_table(filter=expression, columns=scan_columns)
+        table = _filter_list_columns(table, list_filters)
+        total_count = table.num_rows
+        if sort is not None:
+            sort_column = table.column(sort)
+            if pa.types.is_dictionary(sort_column.type):
+                sort_column = sort_column.cast(sort_column.type.value_type)
+            table = table.take(pc.array_sort_indices(sort_column, order=sort_order))
+        table = table.slice(offset, limit)
+
+    if columns:
+        table = table.select(columns)
+    return table, total_count
+
+
+def facet_counts(path, column, filters=None):
+    """
+    Count the rows for each distinct value in a column, for rows that match
+    the filters. Values of list columns are counted individually, once for
+    each row that has them.
+
+    Returns a Table of "values" and "counts", with the most common first.
+    """
+    filters = filters or {}
+    dataset, expression, list_filters = _scan(path, filters, [column])
+    scan_columns = list(dict.fromkeys([column] + list(list_filters)))
+    table = dataset.to_table(filter=expression, columns=scan_columns)
+    table = _filter_list_columns(table, list_filters)
+
+    values = table.column(column)
+    if pa.types.is_list(values.type):
+        values = values.combine_chunks()
+        # Count a value only once for a row that has it several times
+        pairs = pa.table(
+            {"row": pc.list_parent_indices(values), "value": pc.list_flatten(values)}
+        )
+        values = pairs.group_by(["row", "value"]).aggregate([]).column("value")
+    counts = pc.value_counts(values)
+    table = pa.table(
+        {"values": counts.field("values"), "counts": counts.field("counts")}
+    )
+    return table.sort_by([("counts", "descending")])
+
+
+def to_ipc(table):
+    """Serialize a Table in the Arrow IPC streaming format."""
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
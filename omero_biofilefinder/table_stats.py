@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2025 University of Dundee.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Per-column statistics for BFF tables, stored in the parquet metadata.
+
+BFF needs the distinct values of each column for grouping and filters. We
+compute them once when a table is exported, so that they can be read from
+the parquet footer without scanning the whole table.
+"""
+
+import json
+import struct
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+STATS_KEY = b"omero_biofilefinder.stats"
+# Only store counts for the most common values of each column
+MAX_VALUE_COUNTS = 100
+# Columns added for every Image, that aren't from Key-Value pairs
+IMAGE_COLUMNS = ("File Path", "File Name", "Dataset", "Well", "Thumbnail", "Uploaded")
+# Links from Images to Map annotations when the table was exported, to
+# check that it is up to date
+MAP_LINK_COUNT_KEY = b"omero_biofilefinder.map_link_count"
+
+
+def column_stats(column, value_counts=True):
+    """
+    Null count, distinct count, min/max and top value counts of a column.
+
+    Use value_counts=False for columns of (mostly) unique values, e.g. URLs,
+    where counting each value is slow and the top counts are all 1.
+    """
+    stats = {"null_count": column.null_count}
+    if pa.types.is_list(column.type):
+        column = pc.list_flatten(column)
+    values = pc.drop_null(column)
+    if not value_counts:
+        stats["distinct_count"] = pc.count_distinct(values).as_py()
+        try:
+            min_max = pc.min_max(values).as_py()
+            stats["min"], stats["max"] = min_max["min"], min_max["max"]
+        except (pa.ArrowNotImplementedError, pa.ArrowTypeError):
+            pass
+        return stats
+    counts = pc.value_counts(values)
+    distinct = counts.field("values")
+    if pa.types.is_dictionary(distinct.type):
+        distinct = distinct.dictionary_decode()
+    stats["distinct_count"] = len(distinct)
+    if len(counts) > 0:
+        order = pc.array_sort_indices(counts.field("counts"), order="descending")
+        top = counts.take(order[:MAX_VALUE_COUNTS])
+        stats["value_counts"] = [
+            [v, c]
+            for v, c in zip(
+                distinct.take(order[:MAX_VALUE_COUNTS]).to_pylist(),
+                top.field("counts").to_pylist(),
+            )
+        ]
+    try:
+        # min/max of the distinct values is quicker than of all values
+        min_max = pc.min_max(distinct).as_py()
+        stats["min"], stats["max"] = min_max["min"], min_max["max"]
+    except (pa.ArrowNotImplementedError, pa.ArrowTypeError):
+        pass
+    return stats
+
+
+def compute_stats(table):
+    return {
+        "num_rows": table.num_rows,
+        "columns": {
+            name: column_stats(table.column(name), name not in IMAGE_COLUMNS)
+            for name in table.column_names
+        },
+    }
+
+
+def with_stats(table):
+    """Return the table with statistics added to the schema metadata."""
+    metadata = dict(table.schema.metadata or {})
+    metadata[STATS_KEY] = json.dumps(compute_stats(table), default=str).encode()
+    return table.replace_schema_metadata(metadata)
+
+
+def read_stats(metadata):
+    """Return the statistics from parquet (or schema) metadata, or None."""
+    if metadata is None or STATS_KEY not in metadata:
+        return None
+    return json.loads(metadata[STATS_KEY])
+
+
+def read_map_link_count(metadata):
+    """Return the Map annotation link count from parquet metadata, or None."""
+    if metadata is None or MAP_LINK_COUNT_KEY not in metadata:
+        return None
+    return int(metadata[MAP_LINK_COUNT_KEY])
+
+
+def read_footer_metadata(read_bytes, size):
+    """
+    Read the metadata of a parquet file from its footer only.
+
+    read_bytes(offset, length) reads part of the file, e.g. from a
+    RawFileStore, so we don't need to download the whole file.
+    """
+    # The file ends with the footer, its length (4 bytes) and "PAR1"
+    if size < 12:
+        raise ValueError("Not a parquet file")
+    tail = read_bytes(size - 8, 8)
+    if len(tail) != 8 or tail[4:] != b"PAR1":
+        raise ValueError("Not a parquet file")
+    footer_length = struct.unpack("<I", tail[:4])[0]
+    footer = read_bytes(size - 8 - footer_length, footer_length)
+    buffer = pa.BufferReader(b"PAR1" + footer + tail)
+    return pq.read_metadata(buffer).metadata
+
+
+def suggest_group_by(stats, count=3):
+    """
+    Suggest Keys for grouping: those with values on most rows and with
+    several (but not too many) distinct values.
+    """
+    num_rows = stats["num_rows"]
+    candidates = []
+    for name, col_stats in stats["columns"].items():
+        if name in IMAGE_COLUMNS:
+            continue
+        distinct = col_stats.get("distinct_count", 0)
+        if 1 < distinct <= max(2, num_rows // 2):
+            candidates.append((col_stats["null_count"], distinct, name))
+    return [name for _, _, name in sorted(candidates)[:count]]
@@ -17,7 +17,6 @@
 #
 
 from django.urls import path, re_path
-from omeroweb.webclient.views import download_annotation
 
 from . import views
 
@@ -28,7 +27,7 @@ urlpatterns = [
     # when BFF loads a parquet file, the url needs to end with .parquet
     path(
         "fileann/<int:ann_id>/omero.parquet",
-        download_annotation,
+        views.fileann_parquet,
         name="omero_biofilefinder_fileann",
     ),
     path(
@@ -41,5 +40,66 @@ urlpatterns = [
         views.omero_to_csv,
         name="omero_biofilefinder_csv",
     ),
+    re_path(
+        r"^(?P<obj_type>(project|dataset|plate))/(?P<obj_id>[0-9]+)/omero.parquet$",
+        views.omero_to_parquet,
+        name="omero_biofilefinder_parquet",
+    ),
+    re_path(
+        r"^(?P<obj_type>(project|dataset))/(?P<obj_id>[0-9]+)/export$",
+        views.export_in_background,
+        name="omero_biofilefinder_export",
+    ),
+    path(
+        "fileann/<int:ann_id>/query",
+        views.query_table,
+        name="omero_biofilefinder_fileann_query",
+    ),
+    path(
+        "fileann/<int:ann_id>/facets/<path:column>",
+        views.table_facets,
+        name="omero_biofilefinder_fileann_facets",
+    ),
+    re_path(
+        r"^(?P<obj_type>(project|dataset|plate))/(?P<obj_id>[0-9]+)/query$",
+        views.query_table,
+        name="omero_biofilefinder_query",
+    ),
+    re_path(
+        (
+            r"^(?P<obj_type>(project|dataset|plate))/(?P<obj_id>[0-9]+)"
+            r"/facets/(?P<column>.+)$"
+        ),
+        views.table_facets,
+        name="omero_biofilefinder_facets",
+    ),
+    path(
+        "fileann/<int:ann_id>/stats",
+        views.table_stats,
+        name="omero_biofilefinder_fileann_stats",
+    ),
+    re_path(
+        r"^(?P<obj_type>(project|dataset|plate))/(?P<obj_id>[0-9]+)/stats$",
+        views.table_stats,
+        name="omero_biofilefinder_stats",
+    ),
+    path(
+        "group/<int:group_id>", views.open_group, name="omero_biofilefinder_open_group"
+    ),
+    path(
+        "group/<int:group_id>/omero.parquet",
+        views.group_parquet,
+        name="omero_biofilefinder_group",
+    ),
+    path(
+        "group/<int:group_id>/query",
+        views.query_table,
+        name="omero_biofilefinder_group_query",
+    ),
+    path(
+        "group/<int:group_id>/facets/<path:column>",
+        views.table_facets,
+        name="omero_biofilefinder_group_facets",
+    ),
     re_path(r"^bff/app/(?P<url>.*)$", views.app, name="bff_static"),
 ]
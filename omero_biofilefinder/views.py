@@ -20,28 +20,69 @@ import csv
 import io
 import json
 import urllib
-from collections import defaultdict
+from datetime import datetime
+
+import omero
 
 # TODO: try/except for pyarrow import
 import pyarrow as pa
 import pyarrow.parquet as pq
-from django.http import Http404, HttpResponse
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseNotAllowed,
+    HttpResponseRedirect,
+    JsonResponse,
+)
 from django.shortcuts import render
 from django.urls import reverse
+from omero.rtypes import rlist, rlong, rstring
 from omeroweb.decorators import login_required
 from omeroweb.webclient.tree import marshal_annotations
 from omeroweb.webgateway.views import perform_table_query
 
 from . import biofilefinder_settings as settings
+from . import group_index, image_metadata, table_query
+from .compression import compress_content, compressed_response
+from .file_cache import file_response, get_cached_file
+from .image_metadata import load_image_metadata, parse_extra_columns
+from .kvp_accumulator import MULTI_VALUE_LIST, KeyValueAccumulator
+from .preflight import (
+    STRATEGY_CSV,
+    STRATEGY_PARQUET,
+    choose_strategy,
+    estimate,
+    is_fresh,
+)
+from .single_flight import ExportsBusy, busy_response, export_slot, single_flight
+from .table_cache import get_table_path
+from .table_query import ARROW_STREAM_TYPE
+from .table_stats import (
+    compute_stats,
+    read_footer_metadata,
+    read_map_link_count,
+    read_stats,
+    suggest_group_by,
+    with_stats,
+)
 
 BFF_NAMESPACE = "omero_biofilefinder.parquet"
 TABLE_NAMESPACE = "openmicroscopy.org/omero/bulk_annotations"
+PARQUET_TYPE = "application/vnd.apache.parquet"
+ANNOTATIONS_BATCH_SIZE = 1000
+CSV_BATCH_SIZE = 1000
+# Path of the script on the OMERO server, for exporting in the background
+EXPORT_SCRIPT_PATH = "/omero/annotation_scripts/Export_to_Biofile_Finder.py"
+EXPORT_TYPES = ("project", "dataset")
 
 
 @login_required()
 def index(request, conn=None, **kwargs):
-    # Placeholder index page
-    return render(request, "omero_biofilefinder/index.html", {})
+    # Groups that can be opened in BFF
+    groups = [
+        {"id": group.id, "name": group.getName()} for group in conn.getGroupsMemberOf()
+    ]
+    return render(request, "omero_biofilefinder/index.html", {"groups": groups})
 
 
 def get_bff_url(request, data_url, fname, ext="csv"):
@@ -63,17 +104,58 @@ def get_bff_url(request, data_url, fname, ext="csv"):
     return bff_url
 
 
+def get_column_query(keys):
+    """
+    Columns to show in BFF, e.g. "File Name:0.25,Dataset:0.25,Key1:0.25,Key2:0.25"
+    """
+    # Show max 5 columns (4 keys)
+    col_names = ["File Name", "Dataset"] + keys[:3]
+    col_width = 1 / len(col_names)
+    return ",".join([f"{name}:{col_width}:.2f" for name in col_names])
+
+
+def read_fileann_metadata(conn, ann):
+    """
+    Read the metadata from the footer of a parquet FileAnnotation.
+
+    Returns None if the file isn't a parquet file.
+    """
+    orig_file = ann.getFile()
+    rfs = conn.createRawFileStore()
+    try:
+        rfs.setFileId(orig_file.id, conn.SERVICE_OPTS)
+        return read_footer_metadata(rfs.read, orig_file.getSize())
+    except (ValueError, omero.ServerError):
+        return None
+    finally:
+        rfs.close()
+
+
+def read_fileann_stats(conn, ann):
+    """
+    Read statistics from the footer of a parquet FileAnnotation.
+
+    Returns None if the file has no statistics or isn't a parquet file.
+    """
+    return read_stats(read_fileann_metadata(conn, ann))
+
+
 @login_required()
 def open_with_bff(request, conn=None, **kwargs):
     """
     Open-with > BFF goes here...
 
-    We give various options to the user to open with BFF.
-
-    1. We generate a URL for loading csv for the project (on the fly)
-    and then add that to a BFF url so it loads KVPs on the fly.
-    2. If there is a BFF parquet file already attached to the project,
-    we can use that instead of the csv file.
+    We count the Images and Key-Value pairs first, then offer the quickest
+    way to open with BFF that won't time out:
+
+    1. If there is an up-to-date BFF parquet file attached to the project,
+    we use that.
+    2. Otherwise, for small projects we generate a URL for loading csv (or
+    parquet for larger tables) on the fly and then add that to a BFF url
+    so it loads KVPs on the fly.
+    3. For large projects and datasets, we can run the export script in the
+    background. Large plates can't be exported, so we link to the index of
+    their group instead.
     """
 
     for obj_type in ["project", "plate", "dataset"]:
@@ -86,55 +168,19 @@ def open_with_bff(request, conn=None, **kwargs):
     else:
         obj_id = int(obj_id)
 
-    csv_url = reverse(
-        "omero_biofilefinder_csv", kwargs={"obj_id": obj_id, "obj_type": obj_type}
-    )
-    bff_url = get_bff_url(request, csv_url, "omero.csv", ext="csv")
-
-    # We want to pick some columns to show in the BFF app.
-    # Need to know a few Keys from Key-Value pairs.
-    # Let's just check first 5 images...
-    image_ids = []
     obj = conn.getObject(obj_type, obj_id)
     if obj is None:
         raise Http404("{obj_type}:{obj_id} Not Found")
 
-    if obj_type == "project" or obj_type == "dataset":
-        if obj_type == "project":
-            datasets = list(obj.listChildren())
-        else:
-            datasets = [obj]
-        for dataset in datasets:
-            for image in dataset.listChildren():
-                image_ids.append(image.id)
-                if len(image_ids) > 5:
-                    break
-            if len(image_ids) > 5:
-                break
-    elif obj_type == "plate":
-        for well in obj.listChildren():
-            image = well.getImage(0)
-            image_ids.append(image.id)
-            if len(image_ids) > 5:
-                break
-
-    if len(image_ids) == 0:
+    # Count Images and Key-Value pairs, without loading them, to choose
+    # how to load the table without timing out
+    preflight = estimate(conn, obj_type, obj_id)
+    if preflight["image_count"] == 0:
         return HttpResponse(f"No images found in {obj_type}:{obj_id}")
 
-    # Get KVP keys for 5 images...
-    anns, experimenters = marshal_annotations(conn, image_ids=image_ids, ann_type="map")
-    keys = defaultdict(int)
-    for ann in anns:
-        for key, val in ann["values"]:
-            keys[key] += 1
-    # Sort keys by number of occurrences and take the top 3
-    sorted_keys = sorted(keys.keys(), key=lambda x: keys[x], reverse=True)
-    # Show max 5 columns (4 keys)
-    col_names = ["File Name", "Dataset"] + sorted_keys[:3]
-    col_width = 1 / len(col_names)
-    # column query e.g. "File Name:0.25,Dataset:0.25,Key1:0.25,Key2:0.25"
-    col_query = ",".join([f"{name}:{col_width}:.2f" for name in col_names])
-    bff_url += "&c=" + col_query
+    # We want to pick some columns to show in the BFF app:
+    # the most common Keys from Key-Value pairs.
+    sorted_keys = [key for key, _ in preflight["key_counts"]]
 
     # If there is a parquet file already attached to the project, we can
     # use that instead of the csv file.
@@ -143,18 +189,58 @@ def open_with_bff(request, conn=None, **kwargs):
     for ann in obj.listAnnotations(ns=BFF_NAMESPACE):
         if ann.getFile() is not None:
             pq_url = reverse("omero_biofilefinder_fileann", kwargs={"ann_id": ann.id})
+            # Statistics from the parquet footer suggest Keys for grouping
+            metadata = read_fileann_metadata(conn, ann)
+            stats = read_stats(metadata)
+            suggested_keys = suggest_group_by(stats) if stats else []
+            created = ann.creationEventDate()
+            fresh = is_fresh(
+                {
+                    "created": created,
+                    "num_rows": stats.get("num_rows") if stats else None,
+                    "map_link_count": read_map_link_count(metadata),
+                },
+                preflight,
+            )
+            bbf_url = get_bff_url(request, pq_url, "omero.parquet", ext="parquet")
+            if suggested_keys:
+                bbf_url += "&c=" + get_column_query(suggested_keys)
             bff_parquet_anns.append(
                 {
                     "id": ann.id,
                     "name": ann.getFile().getName(),
                     "description": ann.getDescription(),
                     "size": ann.getFile().getSize(),
-                    "created": ann.creationEventDate().strftime("%Y-%m-%d %H:%M:%S.%Z"),
-                    "bbf_url": get_bff_url(
-                        request, pq_url, "omero.parquet", ext="parquet"
-                    ),
+                    "created": created.strftime("%Y-%m-%d %H:%M:%S.%Z"),
+                    "suggested_keys": suggested_keys,
+                    "fresh": fresh,
+                    "bbf_url": bbf_url,
                 }
             )
+
+    list_columns = settings.MULTI_VALUE_MODE == MULTI_VALUE_LIST
+    can_export = obj_type in EXPORT_TYPES
+    strategy = choose_strategy(
+        preflight,
+        fresh_parquet=any(ann["fresh"] for ann in bff_parquet_anns),
+        list_columns=list_columns,
+        can_export=can_export,
+    )
+    bff_url = None
+    if strategy == STRATEGY_CSV:
+        csv_url = reverse(
+            "omero_biofilefinder_csv", kwargs={"obj_id": obj_id, "obj_type": obj_type}
+        )
+        bff_url = get_bff_url(request, csv_url, "omero.csv", ext="csv")
+    elif strategy == STRATEGY_PARQUET:
+        pq_url = reverse(
+            "omero_biofilefinder_parquet",
+            kwargs={"obj_id": obj_id, "obj_type": obj_type},
+        )
+        bff_url = get_bff_url(request, pq_url, "omero.parquet", ext="parquet")
+    if bff_url is not None:
+        bff_url += "&c=" + get_column_query(sorted_keys[:3])
+
     for ann in obj.listAnnotations(ns=TABLE_NAMESPACE):
         table_pq_url = reverse(
             "omero_biofilefinder_table_to_parquet", kwargs={"ann_id": ann.id}
@@ -174,6 +260,11 @@ def open_with_bff(request, conn=None, **kwargs):
 
     context = {
         "bff_url": bff_url,
+        "strategy": strategy,
+        "preflight": preflight,
+        "can_export": can_export,
+        "group_id": obj.getDetails().group.id.val,
+        "export_job": request.GET.get("export_job"),
         "target": {"dtype": obj_type, "id": obj_id, "name": obj.getName()},
         "bff_parquet_anns": bff_parquet_anns,
         "table_anns": table_anns,
@@ -183,14 +274,143 @@ def open_with_bff(request, conn=None, **kwargs):
 
 
 @login_required()
-def omero_to_csv(request, obj_type, obj_id, conn=None, **kwargs):
-
+def export_in_background(request, obj_type, obj_id, conn=None, **kwargs):
+    """
+    Run the Export to Biofile Finder script, which attaches a parquet file
+    to the Project or Dataset, then return to the open_with_bff page.
+    """
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    if obj_type not in EXPORT_TYPES:
+        raise Http404(f"Can't export {obj_type} in the background")
+    obj_id = int(obj_id)
     obj = conn.getObject(obj_type, obj_id)
     if obj is None:
-        raise Http404("{obj_type}:{obj_id} Not Found")
+        raise Http404(f"{obj_type}:{obj_id} Not Found")
+
+    svc = conn.getScriptService()
+    try:
+        script_id = svc.getScriptID(EXPORT_SCRIPT_PATH)
+    except omero.ApiUsageException:
+        script_id = -1
+    if script_id < 0:
+        raise Http404(f"Script not found: {EXPORT_SCRIPT_PATH}")
+
+    base_url = request.build_absolute_uri(reverse("index"))
+    if settings.FORCE_HTTPS:
+        base_url = base_url.replace("http://", "https://")
+    extra_columns = parse_extra_columns(settings.EXTRA_COLUMNS)
+    inputs = {
+        "Data_Type": rstring(obj_type.capitalize()),
+        "IDs": rlist([rlong(obj_id)]),
+        "Base_URL": rstring(base_url),
+        "Multi_Value_Mode": rstring(settings.MULTI_VALUE_MODE.capitalize()),
+        "Value_Delimiter": rstring(settings.VALUE_DELIMITER),
+        "Extra_Columns": rlist([rstring(name) for name in extra_columns]),
+    }
+    conn.SERVICE_OPTS.setOmeroGroup(obj.getDetails().group.id.val)
+    proc = svc.runScript(script_id, inputs, None, conn.SERVICE_OPTS)
+    job_id = proc.getJob().id.val
+    # Leave the script running
+    proc.close(False)
+
+    url = reverse("omero_biofilefinder_openwith")
+    return HttpResponseRedirect(f"{url}?{obj_type}={obj_id}&export_job={job_id}")
+
+
+def check_group_member(conn, group_id):
+    """Raise Http404 unless the user is in the group (or is an admin)."""
+    if conn.isAdmin():
+        return
+    if group_id not in [group.id for group in conn.getGroupsMemberOf()]:
+        raise Http404(f"ExperimenterGroup:{group_id} Not Found")
+
+
+def get_group_index(conn, group_id):
+    """
+    Return the directory and state of the index for a group, starting a
+    refresh in the background if it is stale.
+    """
+    check_group_member(conn, group_id)
+    path = group_index.index_dir(conn, group_id)
+    state = group_index.read_state(path)
+    if group_index.is_stale(state):
+        conn.SERVICE_OPTS.setOmeroGroup(group_id)
+        group_index.start_refresh(conn, path)
+    return path, state
+
+
+def index_not_ready_response():
+    response = HttpResponse(
+        "The index of the group is being built. Please try again later.",
+        status=503,
+        content_type="text/plain",
+    )
+    response["Retry-After"] = str(settings.RETRY_AFTER)
+    return response
+
+
+@login_required()
+def open_group(request, group_id, conn=None, **kwargs):
+    """
+    Open all the Images in a group with BFF, from the group index.
+
+    The index is built or refreshed in the background, so that we never wait
+    for it here.
+    """
+    group = conn.getObject("ExperimenterGroup", group_id)
+    if group is None:
+        raise Http404(f"ExperimenterGroup:{group_id} Not Found")
+    group_name = group.getName()
+    path, state = get_group_index(conn, group_id)
+
+    bff_url = None
+    refreshed = None
+    if state is not None:
+        pq_url = reverse("omero_biofilefinder_group", kwargs={"group_id": group_id})
+        bff_url = get_bff_url(request, pq_url, "omero_group.parquet", ext="parquet")
+        bff_url += "&c=" + get_column_query(["Project"])
+        refreshed = datetime.fromtimestamp(state["refreshed"])
+
+    context = {
+        "bff_url": bff_url,
+        "target": {"dtype": "group", "id": group_id, "name": group_name},
+        "refreshed": refreshed,
+        "refreshing": group_index.is_refreshing(path),
+    }
+    return render(request, "omero_biofilefinder/open_group.html", context)
+
+
+@login_required()
+def group_parquet(request, group_id, conn=None, **kwargs):
+    """
+    Serve the index of a group as a single parquet file, starting a refresh
+    in the background if it is stale.
+    """
+    # If BFF is trying to load a 0 byte file, we return an empty response
+    if request.headers.get("Range") == "bytes=0-0":
+        return HttpResponse("", status=200)
+
+    path, state = get_group_index(conn, group_id)
+    if state is None:
+        return index_not_ready_response()
+    return file_response(
+        request,
+        group_index.combined_path(path, state),
+        f"group_{group_id}.parquet",
+        PARQUET_TYPE,
+    )
+
 
-    image_ids = []
-    parent_names_by_iid = {}
+def get_images_kvps(request, conn, obj_type, obj):
+    """
+    Load the Images in a Project, Dataset or Plate and their Key-Value pairs.
+
+    Returns the column names, a list of [path, name, parent, thumbnail, date]
+    for each Image, a KeyValueAccumulator with a row per Image and
+    {column name: values} for the omero.web.bff.extra_columns.
+    """
+    images = []
     parent_colname = "Dataset"
 
     if obj_type == "project" or obj_type == "dataset":
@@ -200,70 +420,161 @@ def omero_to_csv(request, obj_type, obj_id, conn=None, **kwargs):
             datasets = [obj]
         for dataset in datasets:
             for image in dataset.listChildren():
-                image_ids.append(image.id)
-                parent_names_by_iid[image.id] = dataset.getName()
+                images.append((image, dataset.getName()))
     elif obj_type == "plate":
         parent_colname = "Well"
         for well in obj.listChildren():
             for ws in well.listChildren():
-                image = ws.getImage()
-                image_ids.append(image.id)
-                parent_names_by_iid[image.id] = well.getWellPos()
+                images.append((ws.getImage(), well.getWellPos()))
+
+    accumulator = KeyValueAccumulator()
+    image_url = request.build_absolute_uri(reverse("webindex"))
+    rows = []
+    for image, parent_name in images:
+        accumulator.add_image(image.id)
+        thumb_url = reverse("webgateway_render_thumbnail", kwargs={"iid": image.id})
+        rows.append(
+            [
+                # we end url with .png so that BFF enables open-with "Browser"
+                f"{image_url}?show=image-{image.id}&_=.png",
+                image.getName(),
+                parent_name,
+                request.build_absolute_uri(thumb_url),
+                image.creationEventDate().strftime("%Y-%m-%d %H:%M:%S.%Z"),
+            ]
+        )
 
-    # We use page=-1 to avoid pagination (default is 500)
-    anns, experimenters = marshal_annotations(
-        conn, image_ids=image_ids, ann_type="map", page=-1
-    )
+    # Images can be in several Datasets
+    image_ids = list(dict.fromkeys(accumulator.image_ids))
+    # Load annotations in batches, so we don't hold them all in memory
+    for i in range(0, len(image_ids), ANNOTATIONS_BATCH_SIZE):
+        batch_ids = image_ids[i : i + ANNOTATIONS_BATCH_SIZE]
+        # We use page=-1 to avoid pagination (default is 500)
+        anns, experimenters = marshal_annotations(
+            conn, image_ids=batch_ids, ann_type="map", page=-1
+        )
+        accumulator.add_annotations(anns)
 
-    # Get all the Keys...
-    keys = set()
-    for ann in anns:
-        for key_val in ann["values"]:
-            keys.add(key_val[0])
-
-    # Add values to dict {image_id: {key: [list, of, values]}}
-    kvp = {}
-    for ann in anns:
-        image_id = ann["link"]["parent"]["id"]
-        if image_id not in kvp:
-            kvp[image_id] = defaultdict(list)
-        for key_val in ann["values"]:
-            key = key_val[0]
-            value = key_val[1]
-            kvp[image_id][key].append(value)
+    extra_columns = parse_extra_columns(settings.EXTRA_COLUMNS)
+    extra = load_image_metadata(conn, accumulator.image_ids, extra_columns)
 
     column_names = ["File Path", "File Name", parent_colname, "Thumbnail"]
-    column_names.extend(list(keys))
+    column_names.extend(accumulator.keys())
+    column_names.extend(extra.keys())
     column_names.append("Uploaded")
+    return column_names, rows, accumulator, extra
 
-    # write csv to return as http response
-    with io.StringIO() as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(column_names)
-        for image_id in image_ids:
-            values = kvp.get(image_id, {})
-            thumb_url = reverse("webgateway_render_thumbnail", kwargs={"iid": image_id})
-            thumb_url = request.build_absolute_uri(thumb_url)
-            image = conn.getObject("Image", image_id)
-            image_url = request.build_absolute_uri(reverse("webindex"))
-            # we end url with .png so that BFF enables open-with "Browser"
-            image_url += f"?show=image-{image_id}&_=.png"
-            row = [
-                image_url,
-                image.getName() if image else "Not Found",
-                parent_names_by_iid.get(image_id, "Not Found"),
-                thumb_url,
-            ]
-            for key in keys:
-                row.append(",".join(values.get(key, [])))
-            row.append(image.creationEventDate().strftime("%Y-%m-%d %H:%M:%S.%Z"))
-            writer.writerow(row)
 
-        response = HttpResponse(csvfile.getvalue(), content_type="text/csv")
+def get_kvp_table(request, conn, obj_type, obj):
+    """Return a pyarrow Table of the Images and Key-Value pairs for BFF."""
+    column_names, rows, accumulator, extra = get_images_kvps(
+        request, conn, obj_type, obj
+    )
+    columns = [[row[col] for row in rows] for col in range(4)]
+    columns.extend(
+        accumulator.to_arrays(
+            mode=settings.MULTI_VALUE_MODE,
+            delimiter=settings.VALUE_DELIMITER,
+            infer_types=True,
+        )
+    )
+    columns.extend(
+        image_metadata.metadata_arrays(
+            extra,
+            list_columns=settings.MULTI_VALUE_MODE == MULTI_VALUE_LIST,
+            delimiter=settings.VALUE_DELIMITER,
+        )
+    )
+    columns.append([row[4] for row in rows])
+    return with_stats(pa.table(columns, names=column_names))
+
+
+@login_required()
+@single_flight
+def omero_to_csv(request, obj_type, obj_id, conn=None, **kwargs):
+
+    obj = conn.getObject(obj_type, obj_id)
+    if obj is None:
+        raise Http404("{obj_type}:{obj_id} Not Found")
+
+    column_names, rows, accumulator, extra = get_images_kvps(
+        request, conn, obj_type, obj
+    )
+    kvp_rows = accumulator.iter_rows(delimiter=settings.VALUE_DELIMITER)
+    delimiter = settings.VALUE_DELIMITER
+    extra_columns = [
+        [
+            delimiter.join(value) if isinstance(value, list) else value
+            for value in values
+        ]
+        for values in extra.values()
+    ]
+
+    def csv_chunks():
+        # write csv in batches of rows, compressed as they are produced
+        with io.StringIO() as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(column_names)
+            for count, (row, kvp_values) in enumerate(zip(rows, kvp_rows)):
+                extra_values = [values[count] for values in extra_columns]
+                writer.writerow(row[:4] + kvp_values + extra_values + row[4:])
+                if count % CSV_BATCH_SIZE == 0:
+                    yield csvfile.getvalue().encode()
+                    csvfile.seek(0)
+                    csvfile.truncate()
+            yield csvfile.getvalue().encode()
+
+    return compressed_response(request, csv_chunks(), "text/csv")
+
+
+@login_required()
+@single_flight
+def omero_to_parquet(request, obj_type, obj_id, conn=None, **kwargs):
+    """
+    Load Key-Value pairs on the fly as parquet.
+
+    With the omero.web.bff.multi_value_mode setting "list", Keys that have
+    several values on an Image are written as list columns.
+    """
+    # If BFF is trying to load a 0 byte file, we return an empty response
+    if request.headers.get("Range") == "bytes=0-0":
+        return HttpResponse("", status=200)
+
+    obj = conn.getObject(obj_type, obj_id)
+    if obj is None:
+        raise Http404(f"{obj_type}:{obj_id} Not Found")
+
+    table = get_kvp_table(request, conn, obj_type, obj)
+
+    with io.BytesIO() as buffer:
+        pq.write_table(table, buffer)
+        ct = PARQUET_TYPE
+        response = compress_content(request, buffer.getvalue(), ct)
+        response["Content-Disposition"] = (
+            f'attachment; filename="{obj_type}_{obj_id}.parquet"'
+        )
         return response
 
 
 @login_required()
+def fileann_parquet(request, ann_id, conn=None, **kwargs):
+    """
+    Serve a parquet FileAnnotation from the local file cache, so that only
+    the first request needs to download the file from OMERO.
+    """
+    # If BFF is trying to load a 0 byte file, we return an empty response
+    if request.headers.get("Range") == "bytes=0-0":
+        return HttpResponse("", status=200)
+
+    ann = conn.getObject("FileAnnotation", ann_id)
+    if ann is None or ann.getFile() is None:
+        raise Http404(f"FileAnnotation:{ann_id} Not Found")
+    path = get_cached_file(ann)
+    return file_response(request, path, ann.getFile().getName(), PARQUET_TYPE)
+
+
+@login_required()
+@single_flight
 def table_to_parquet(request, ann_id, conn=None, **kwargs):
     """
     Convert an OMERO.table to a parquet file on the fly.
@@ -327,17 +638,150 @@ def table_to_parquet(request, ann_id, conn=None, **kwargs):
 
     combined_table = pa.concat_tables(pyarrow_tables, promote_options="default")
     combined_table.combine_chunks()
+    combined_table = with_stats(combined_table)
 
     with io.BytesIO() as buffer:
         pq.write_table(combined_table, buffer)
-        ct = "application/vnd.apache.parquet"
-        response = HttpResponse(buffer.getvalue(), content_type=ct)
+        ct = PARQUET_TYPE
+        response = compress_content(request, buffer.getvalue(), ct)
         response["Content-Disposition"] = (
             f'attachment; filename="omero_table_{fileid}.parquet"'
         )
         return response
 
 
+def get_query_table_path(
+    request, conn, obj_type=None, obj_id=None, ann_id=None, group_id=None, **kwargs
+):
+    """
+    Return the path to a cached parquet file of the BFF table for a container
+    (built from Key-Value pairs), for a parquet FileAnnotation or for the
+    index of a group.
+
+    Building a container's table uses one of the export slots, as for the
+    csv and parquet exports, and raises ExportsBusy if they are all in use.
+
+    Other kwargs from the view, e.g. "url" from login_required, are ignored.
+    """
+    if group_id is not None:
+        check_group_member(conn, group_id)
+        path = group_index.combined_path(group_index.index_dir(conn, group_id))
+        if path is None:
+            raise Http404(f"Index of ExperimenterGroup:{group_id} is not built yet")
+        return path
+
+    if ann_id is not None:
+        ann = conn.getObject("FileAnnotation", ann_id)
+        if ann is None or ann.getFile() is None:
+            raise Http404(f"FileAnnotation:{ann_id} Not Found")
+        return get_cached_file(ann)
+
+    obj = conn.getObject(obj_type, obj_id)
+    if obj is None:
+        raise Http404(f"{obj_type}:{obj_id} Not Found")
+    # Tables include absolute URLs and depend on the user's permissions
+    key = [
+        obj_type,
+        str(obj_id),
+        str(conn.getUserId()),
+        str(conn.SERVICE_OPTS.getOmeroGroup()),
+        request.get_host(),
+        settings.MULTI_VALUE_MODE,
+        settings.VALUE_DELIMITER,
+        settings.EXTRA_COLUMNS,
+    ]
+
+    def build_table():
+        with export_slot():
+            return get_kvp_table(request, conn, obj_type, obj)
+
+    return get_table_path(key, build_table)
+
+
+@login_required()
+def table_stats(request, conn=None, **kwargs):
+    """
+    Return JSON statistics for each column of the BFF table: null count,
+    distinct count, min, max and counts of the most common values.
+    """
+    ann_id = kwargs.get("ann_id")
+    if ann_id is not None:
+        ann = conn.getObject("FileAnnotation", ann_id)
+        if ann is None or ann.getFile() is None:
+            raise Http404(f"FileAnnotation:{ann_id} Not Found")
+        stats = read_fileann_stats(conn, ann)
+        if stats is not None:
+            return JsonResponse(stats)
+
+    try:
+        path = get_query_table_path(request, conn, **kwargs)
+    except ExportsBusy:
+        return busy_response()
+    metadata = pq.read_schema(path).metadata
+    stats = read_stats(metadata)
+    if stats is None:
+        # e.g. parquet files exported before statistics were added
+        stats = compute_stats(pq.read_table(path))
+    return JsonResponse(stats)
+
+
+def arrow_response(request, table):
+    return compress_content(request, table_query.to_ipc(table), ARROW_STREAM_TYPE)
+
+
+@login_required()
+def query_table(request, conn=None, **kwargs):
+    """
+    Query the BFF table for a container or parquet file, returning Arrow IPC.
+
+    Query parameters:
+        filters: JSON e.g. {"Gene": ["CDC20", "ANLN"]}
+        sort: column name, with "-" prefix for descending order
+        offset, limit: for paging the rows
+        columns: columns to return (repeat for several columns)
+    The total number of rows matching the filters is in X-Total-Count.
+    """
+    try:
+        path = get_query_table_path(request, conn, **kwargs)
+    except ExportsBusy:
+        return busy_response()
+    try:
+        filters = table_query.parse_filters(request.GET.get("filters"))
+        table, total_count = table_query.query_rows(
+            path,
+            filters=filters,
+            sort=request.GET.get("sort"),
+            offset=int(request.GET.get("offset", 0)),
+            limit=int(request.GET.get("limit", 100)),
+            columns=request.GET.getlist("columns"),
+        )
+    except ValueError as ex:
+        return HttpResponse(str(ex), status=400)
+    response = arrow_response(request, table)
+    response["X-Total-Count"] = str(total_count)
+    return response
+
+
+@login_required()
+def table_facets(request, column, conn=None, **kwargs):
+    """
+    Count the rows for each value in a column of the BFF table, returning
+    Arrow IPC with "values" and "counts" columns.
+
+    Use ?filters= (as for query_table) to count only the matching rows.
+    """
+    try:
+        path = get_query_table_path(request, conn, **kwargs)
+    except ExportsBusy:
+        return busy_response()
+    try:
+        filters = table_query.parse_filters(request.GET.get("filters"))
+        table = table_query.facet_counts(path, column, filters=filters)
+    except ValueError as ex:
+        return HttpResponse(str(ex), status=400)
+    return arrow_response(request, table)
+
+
 def app(request, url, **kwargs):
     from django.contrib.staticfiles.storage import staticfiles_storage
 
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2025 University of Dundee.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+
+"""Fixtures shared by the integration tests."""
+
+import pytest
+from omero.gateway import BlitzGateway, MapAnnotationWrapper
+
+
+def get_connection(user, group_id=None):
+    """Get a BlitzGateway connection for the given user's client."""
+    connection = BlitzGateway(client_obj=user[0])
+    # Refresh the session context
+    connection.getEventContext()
+    if group_id is not None:
+        connection.SERVICE_OPTS.setOmeroGroup(group_id)
+    return connection
+
+
+@pytest.fixture()
+def user1(request):
+    """Return a new user in a read-annotate group, for an IWebTest."""
+    test = request.instance
+    group = test.new_group(perms="rwra--")
+    user = test.new_client_and_user(group=group)
+    return user
+
+
+@pytest.fixture()
+def conn(user1):
+    """Return a connection for user1."""
+    return get_connection(user1)
+
+
+@pytest.fixture()
+def add_kvps(conn):
+    """Return a function to link a new MapAnnotation to an Image."""
+
+    def add(image_id, kvps):
+        map_ann = MapAnnotationWrapper(conn)
+        map_ann.setValue(kvps)
+        map_ann.save()
+        conn.getObject("Image", image_id).linkAnnotation(map_ann)
+
+    return add
+
+
+@pytest.fixture()
+def make_dataset_with_kvps(request, user1, add_kvps):
+    """
+    Return a function to make a Dataset with an Image for each list of
+    Key-Value pairs, named after the first value. It returns the Dataset
+    and the Image IDs.
+    """
+    test = request.instance
+
+    def make(name, kvps_list):
+        dataset = test.make_dataset(name=name, client=user1[0])
+        image_ids = []
+        for kvps in kvps_list:
+            image = test.make_image(name=kvps[0][1], client=user1[0])
+            test.link(dataset, image, client=user1[0])
+            add_kvps(image.id.val, kvps)
+            image_ids.append(image.id.val)
+        return dataset, image_ids
+
+    return make
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2025 University of Dundee.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+
+"""Integration tests for the index of all the Images in a group."""
+
+import os
+
+import omero
+import pyarrow.parquet as pq
+from omeroweb.testlib import IWebTest
+
+from omero_biofilefinder import group_index
+
+
+class TestGroupIndex(IWebTest):
+    """Tests building and refreshing the index of a group."""
+
+    def test_refresh_index(
+        self, user1, tmp_path, conn, add_kvps, make_dataset_with_kvps
+    ):
+        """Test building the index, then refreshing it after changes."""
+        project = self.make_project(name="bff_project", client=user1[0])
+        dataset, image_ids = make_dataset_with_kvps(
+            "bff_dataset", [[["Gene", "CDC20"]], [["Gene", "ANLN"]]]
+        )
+        self.link(project, dataset, client=user1[0])
+
+        state = group_index.refresh_index(conn, str(tmp_path))
+        table = pq.read_table(group_index.combined_path(str(tmp_path), state))
+        rows = sorted(table.to_pylist(), key=lambda row: row["Image ID"])
+        assert [row["Image ID"] for row in rows] == image_ids
+        assert [row["Gene"] for row in rows] == ["CDC20", "ANLN"]
+        assert rows[0]["Project"] == "bff_project"
+        assert rows[0]["Dataset"] == "bff_dataset"
+
+        # Only the changed Image is reloaded
+        add_kvps(image_ids[0], [["Cell Line", "HeLa"]])
+        state = group_index.refresh_index(conn, str(tmp_path))
+        table = pq.read_table(group_index.combined_path(str(tmp_path), state))
+        rows = sorted(table.to_pylist(), key=lambda row: row["Image ID"])
+        assert [row["Cell Line"] for row in rows] == ["HeLa", None]
+        # The previous version is kept for requests that are still reading it
+        assert os.path.exists(os.path.join(tmp_path, state["previous"]))
+        # Files from a refresh that was stopped are removed
+        (tmp_path / "part_999999.parquet").write_bytes(b"")
+
+        # Unlinking a Dataset from its Project reloads its Images only
+        params = omero.sys.ParametersI()
+        params.addId(project.id.val)
+        link = conn.getQueryService().findByQuery(
+            "select pdl from ProjectDatasetLink pdl where pdl.parent.id = :id", params
+        )
+        conn.deleteObjects("ProjectDatasetLink", [link.id.val], wait=True)
+        built = state["built"]
+        state = group_index.refresh_index(conn, str(tmp_path))
+        assert state["built"] == built
+        table = pq.read_table(group_index.combined_path(str(tmp_path), state))
+        assert table.column("Project").to_pylist() == [None, None]
+        assert not os.path.exists(tmp_path / "part_999999.parquet")
@@ -19,35 +19,15 @@
 
 """Integration tests for index page."""
 
-import pytest
 from django.urls import reverse
-from omero.gateway import BlitzGateway
 from omeroweb.testlib import IWebTest, get
 
 
-def get_connection(user, group_id=None):
-    """Get a BlitzGateway connection for the given user's client."""
-    connection = BlitzGateway(client_obj=user[0])
-    # Refresh the session context
-    connection.getEventContext()
-    if group_id is not None:
-        connection.SERVICE_OPTS.setOmeroGroup(group_id)
-    return connection
-
-
 class TestLoadIndexPage(IWebTest):
     """Tests loading the index page."""
 
-    @pytest.fixture()
-    def user1(self):
-        """Return a new user in a read-annotate group."""
-        group = self.new_group(perms="rwra--")
-        user = self.new_client_and_user(group=group)
-        return user
-
-    def test_load_index(self, user1):
+    def test_load_index(self, conn):
         """Test loading the app home page."""
-        conn = get_connection(user1)
         user_name = conn.getUser().getName()
         django_client = self.new_django_client(user_name, user_name)
         index_url = reverse("omero_biofilefinder_index")
@@ -55,3 +35,10 @@ class TestLoadIndexPage(IWebTest):
         rsp = get(django_client, index_url)
         html_str = rsp.content.decode()
         assert "Welcome" in html_str
+        # The user's group can be opened
+        group = conn.getGroupFromContext()
+        group_url = reverse(
+            "omero_biofilefinder_open_group", kwargs={"group_id": group.id}
+        )
+        assert {"id": group.id, "name": group.getName()} in rsp.context["groups"]
+        assert group_url in html_str
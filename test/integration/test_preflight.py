@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2025 University of Dundee.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+
+"""Integration tests for choosing how to load a BFF table."""
+
+from datetime import datetime
+
+import pytest
+from django.urls import reverse
+from omeroweb.testlib import IWebTest, get
+
+from omero_biofilefinder import preflight as bff_preflight
+
+
+class TestPreflight(IWebTest):
+    """Tests counting Images and Key-Value pairs before loading them."""
+
+    @pytest.fixture()
+    def project(self, user1, make_dataset_with_kvps):
+        """Return a Project with a Dataset of Images with Key-Value pairs."""
+        project = self.make_project(name="bff_preflight", client=user1[0])
+        kvps_list = [
+            [["Gene", gene], ["Cell Line", "HeLa"]]
+            for gene in ["CDC20", "ANLN", "CDC20"]
+        ]
+        dataset, _ = make_dataset_with_kvps("bff_preflight", kvps_list)
+        self.link(project, dataset, client=user1[0])
+        return project
+
+    def test_estimate(self, project, conn):
+        """Test counting Images, Keys and Key-Value pairs."""
+        preflight = bff_preflight.estimate(conn, "project", project.id.val)
+        assert preflight["image_count"] == 3
+        assert preflight["pair_count"] == 6
+        assert preflight["map_link_count"] == 3
+        assert sorted(preflight["key_counts"]) == [["Cell Line", 3], ["Gene", 3]]
+        assert preflight["last_update"] is not None
+        assert bff_preflight.choose_strategy(preflight) == "csv"
+
+    def test_open_with_bff(self, project, conn):
+        """Test that a small Project is loaded on the fly."""
+        user_name = conn.getUser().getName()
+        django_client = self.new_django_client(user_name, user_name)
+        url = reverse("omero_biofilefinder_openwith")
+        rsp = get(django_client, url, {"project": project.id.val})
+        assert rsp.context["strategy"] == "csv"
+        assert b"on the fly" in rsp.content
+
+
+def test_choose_strategy(monkeypatch):
+    """Test that large Plates, which can't be exported, use the group index."""
+    monkeypatch.setattr(bff_preflight.settings, "ON_THE_FLY_MAX_IMAGES", 10)
+    monkeypatch.setattr(bff_preflight.settings, "CSV_MAX_SIZE", 5)
+    preflight = {"image_count": 100, "csv_size": 1000}
+    assert bff_preflight.choose_strategy(preflight) == "export"
+    assert bff_preflight.choose_strategy(preflight, can_export=False) == "group"
+    assert bff_preflight.choose_strategy(preflight, fresh_parquet=True) == "attached"
+
+
+def test_is_fresh():
+    """Test that unlinked Map annotations make a parquet file out of date."""
+    preflight = {
+        "image_count": 3,
+        "map_link_count": 2,
+        "last_update": datetime(2025, 1, 1),
+    }
+    parquet_ann = {
+        "created": datetime(2025, 1, 2),
+        "num_rows": 3,
+        "map_link_count": 3,
+    }
+    assert not bff_preflight.is_fresh(parquet_ann, preflight)
+    parquet_ann["map_link_count"] = 2
+    assert bff_preflight.is_fresh(parquet_ann, preflight)
+    # Files exported before the link count was added
+    parquet_ann["map_link_count"] = None
+    assert bff_preflight.is_fresh(parquet_ann, preflight)
+    parquet_ann["created"] = datetime(2024, 12, 31)
+    assert not bff_preflight.is_fresh(parquet_ann, preflight)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2025 University of Dundee.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+
+"""Integration tests for querying BFF tables and their statistics."""
+
+import json
+
+import pyarrow as pa
+import pytest
+from django.urls import reverse
+from omeroweb.testlib import IWebTest, get
+
+
+class TestQueryTable(IWebTest):
+    """Tests querying the table of Key-Value pairs for a Dataset."""
+
+    @pytest.fixture()
+    def dataset(self, make_dataset_with_kvps):
+        """Return a Dataset of Images with a 'Gene' Key-Value pair."""
+        kvps_list = [[["Gene", gene]] for gene in ["CDC20", "ANLN", "CDC20"]]
+        dataset, _ = make_dataset_with_kvps("bff_query", kvps_list)
+        return dataset
+
+    def test_query_rows(self, dataset, conn):
+        """Test filtering and paging rows."""
+        user_name = conn.getUser().getName()
+        django_client = self.new_django_client(user_name, user_name)
+        kwargs = {"obj_type": "dataset", "obj_id": dataset.id.val}
+        query_url = reverse("omero_biofilefinder_query", kwargs=kwargs)
+        data = {"filters": json.dumps({"Gene": ["CDC20"]}), "columns": "File Name"}
+        rsp = get(django_client, query_url, data)
+        table = pa.ipc.open_stream(rsp.content).read_all()
+        assert rsp["X-Total-Count"] == "2"
+        assert table.column_names == ["File Name"]
+        assert table.column("File Name").to_pylist() == ["CDC20", "CDC20"]
+
+    def test_facets(self, dataset, conn):
+        """Test counting the values in a column."""
+        user_name = conn.getUser().getName()
+        django_client = self.new_django_client(user_name, user_name)
+        kwargs = {"obj_type": "dataset", "obj_id": dataset.id.val, "column": "Gene"}
+        facets_url = reverse("omero_biofilefinder_facets", kwargs=kwargs)
+        rsp = get(django_client, facets_url)
+        table = pa.ipc.open_stream(rsp.content).read_all()
+        assert table.to_pylist() == [
+            {"values": "CDC20", "counts": 2},
+            {"values": "ANLN", "counts": 1},
+        ]
+
+    def test_stats(self, dataset, conn):
+        """Test statistics for each column."""
+        user_name = conn.getUser().getName()
+        django_client = self.new_django_client(user_name, user_name)
+        kwargs = {"obj_type": "dataset", "obj_id": dataset.id.val}
+        stats_url = reverse("omero_biofilefinder_stats", kwargs=kwargs)
+        stats = get(django_client, stats_url).json()
+        assert stats["num_rows"] == 3
+        gene_stats = stats["columns"]["Gene"]
+        assert gene_stats["null_count"] == 0
+        assert gene_stats["distinct_count"] == 2
+        assert gene_stats["value_counts"] == [["CDC20", 2], ["ANLN", 1]]
+        assert gene_stats["min"] == "ANLN"
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2025 University of Dundee.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Unit tests for compressing responses and cached files."""
+
+import gzip
+import os
+import threading
+
+from django.test import RequestFactory
+
+from omero_biofilefinder import compression
+
+
+def test_compressed_response(monkeypatch):
+    """Content is compressed with the first accepted encoding."""
+    monkeypatch.setattr(compression.settings, "COMPRESSION", "zstd,br,gzip")
+    request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip;q=0.5, br;q=0")
+    content = b"File Path,Gene\n" * 100
+    response = compression.compress_content(request, content, "text/csv")
+    assert response["Content-Encoding"] == "gzip"
+    assert response["Vary"] == "Accept-Encoding"
+    assert gzip.decompress(response.content) == content
+
+    request = RequestFactory().get("/")
+    response = compression.compress_content(request, content, "text/csv")
+    assert not response.has_header("Content-Encoding")
+    assert response.content == content
+
+
+def test_compressed_file(monkeypatch, tmp_path):
+    """Concurrent requests for a compressed copy only compress it once."""
+    path = tmp_path / "table.parquet"
+    path.write_bytes(b"PAR1" * 1000)
+    calls = []
+    compress_chunks = compression.compress_chunks
+
+    def counting_compress_chunks(chunks, encoding):
+        calls.append(encoding)
+        return compress_chunks(chunks, encoding)
+
+    monkeypatch.setattr(compression, "compress_chunks", counting_compress_chunks)
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(compression.compressed_file(path, "gzip"))
+        )
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [f"{path}.gz"] * 4
+    assert calls == ["gzip"]
+    with open(f"{path}.gz", "rb") as f:
+        assert gzip.decompress(f.read()) == b"PAR1" * 1000
+
+
+def test_compressed_file_reused(tmp_path):
+    """The compressed copy is touched when used, and recreated if evicted."""
+    path = tmp_path / "table.parquet"
+    path.write_bytes(b"PAR1" * 1000)
+    compressed_path = compression.compressed_file(path, "gzip")
+    os.utime(compressed_path, (0, 0))
+    assert compression.compressed_file(path, "gzip") == compressed_path
+    assert os.path.getmtime(compressed_path) > 0
+
+    os.remove(compressed_path)
+    assert compression.compressed_file(path, "gzip") == compressed_path
+    with open(compressed_path, "rb") as f:
+        assert gzip.decompress(f.read()) == b"PAR1" * 1000
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2025 University of Dundee.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Unit tests for the local cache of OMERO files."""
+
+import os
+import time
+
+import pytest
+
+from omero_biofilefinder import file_cache, table_cache
+
+
+class OriginalFile:
+    id = 1
+
+    def getSize(self):
+        return 5
+
+    def getHash(self):
+        return "abc"
+
+
+class FileAnnotation:
+    """Just enough of a FileAnnotationWrapper to download its file."""
+
+    def __init__(self):
+        self.downloads = 0
+
+    def getFile(self):
+        return OriginalFile()
+
+    def getFileInChunks(self):
+        self.downloads += 1
+        yield b"PAR1"
+        yield b"!"
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(file_cache.settings, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(file_cache.settings, "FILE_CACHE_SIZE", 1)
+    return tmp_path
+
+
+def test_get_cached_file():
+    """Files are downloaded once, and again if they were evicted."""
+    ann = FileAnnotation()
+    path = file_cache.get_cached_file(ann)
+    assert os.path.basename(path) == "1_5_abc"
+    with open(path, "rb") as f:
+        assert f.read() == b"PAR1!"
+    assert file_cache.get_cached_file(ann) == path
+    assert ann.downloads == 1
+    assert table_cache._path_locks == {}
+
+    os.remove(path)
+    assert file_cache.get_cached_file(ann) == path
+    assert os.path.exists(path)
+    assert ann.downloads == 2
+
+
+def test_get_cached_file_failed(cache_dir):
+    """Nothing is left in the cache if the download fails."""
+
+    class FailingAnnotation(FileAnnotation):
+        def getFileInChunks(self):
+            yield b"PAR1"
+            raise IOError("Connection lost")
+
+    with pytest.raises(IOError):
+        file_cache.get_cached_file(FailingAnnotation())
+    assert os.listdir(cache_dir / "files") == []
+    assert table_cache._path_locks == {}
+
+
+def test_evict(cache_dir):
+    """The least recently used files are evicted, except very recent ones."""
+    now = time.time()
+    for name, age in [("old", 3600), ("older", 7200), ("new", 0)]:
+        with open(cache_dir / name, "wb") as f:
+            f.write(b"x" * 100)
+        os.utime(cache_dir / name, (now - age, now - age))
+
+    file_cache.evict(str(cache_dir), 250)
+    assert sorted(os.listdir(cache_dir)) == ["new", "old"]
+    file_cache.evict(str(cache_dir), 0)
+    assert os.listdir(cache_dir) == ["new"]
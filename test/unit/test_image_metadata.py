@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2025 University of Dundee.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Unit tests for loading extra columns of Image metadata."""
+
+from omero.model import ImageI, LengthI, PixelsI
+from omero.model.enums import UnitsLength
+from omero.rtypes import wrap
+
+from omero_biofilefinder.image_metadata import (
+    QUERIES,
+    load_image_metadata,
+    metadata_arrays,
+)
+
+
+class QueryService(object):
+    """Return the given rows for each query."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def projection(self, query, params, ctx):
+        return [wrap(row) for row in self.rows[query]]
+
+    def findAllByQuery(self, query, params, ctx):
+        return self.rows[query]
+
+
+class Connection(object):
+    SERVICE_OPTS = None
+
+    def __init__(self, rows):
+        self.qs = QueryService(rows)
+
+    def getQueryService(self):
+        return self.qs
+
+
+def pixels(image_id, size_x, size_y=None, unit=UnitsLength.MICROMETER):
+    pix = PixelsI()
+    pix.setImage(ImageI(image_id, False))
+    pix.setPhysicalSizeX(LengthI(size_x, unit))
+    if size_y is not None:
+        pix.setPhysicalSizeY(LengthI(size_y, unit))
+    return pix
+
+
+def test_image_in_several_rows():
+    conn = Connection({QUERIES["dimensions"]: [[1, 10, 20, 1, 3, 1]]})
+    columns = load_image_metadata(conn, [1, 2, 1], ["dimensions"])
+    assert columns["Size X"] == [10, None, 10]
+    assert columns["Size C"] == [3, None, 3]
+
+
+def test_missing_pixels():
+    conn = Connection({QUERIES["pixel_size"]: [pixels(1, 0.5, 0.5)]})
+    columns = load_image_metadata(conn, [1, 2], ["pixel_size"])
+    assert columns["Pixel Size X (µm)"] == [0.5, None]
+    # No physicalSizeZ
+    assert columns["Pixel Size Z (µm)"] == [None, None]
+
+
+def test_pixel_size_units():
+    rows = [pixels(1, 0.5), pixels(2, 250, unit=UnitsLength.NANOMETER)]
+    conn = Connection({QUERIES["pixel_size"]: rows})
+    columns = load_image_metadata(conn, [1, 2], ["pixel_size"])
+    assert columns["Pixel Size X (µm)"] == [0.5, 0.25]
+
+
+def test_list_values():
+    rows = [[1, "DAPI"], [1, "GFP"], [3, "DAPI"]]
+    conn = Connection({QUERIES["channels"]: rows})
+    columns = load_image_metadata(conn, [1, 2, 3, 1], ["channels"])
+    assert columns["Channels"] == [["DAPI", "GFP"], [], ["DAPI"], ["DAPI", "GFP"]]
+
+    (joined,) = metadata_arrays(columns, delimiter="|")
+    assert joined.to_pylist() == ["DAPI|GFP", None, "DAPI", "DAPI|GFP"]
+    (lists,) = metadata_arrays(columns, list_columns=True)
+    assert lists.to_pylist() == [["DAPI", "GFP"], None, ["DAPI"], ["DAPI", "GFP"]]
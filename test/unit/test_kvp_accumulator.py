@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2025 University of Dundee.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+
+"""Unit tests for collecting Key-Value pairs as columns."""
+
+import pyarrow as pa
+import pytest
+
+from omero_biofilefinder.kvp_accumulator import (
+    MULTI_VALUE_LIST,
+    KeyValueAccumulator,
+    infer_type,
+)
+
+
+@pytest.fixture()
+def accumulator():
+    """Return an accumulator with 3 Images and a multi-valued Key."""
+    accumulator = KeyValueAccumulator()
+    for image_id in [1, 2, 3]:
+        accumulator.add_image(image_id)
+    accumulator.add(1, "Gene", "CDC20")
+    accumulator.add(2, "Gene", "ANLN")
+    accumulator.add(2, "Gene", "PRC1")
+    accumulator.add(3, "Count", "5")
+    return accumulator
+
+
+def test_iter_rows(accumulator):
+    """Test rows of strings, with several values joined."""
+    assert accumulator.keys() == ["Gene", "Count"]
+    rows = list(accumulator.iter_rows(delimiter="|"))
+    assert rows == [["CDC20", ""], ["ANLN|PRC1", ""], ["", "5"]]
+
+
+def test_to_arrays(accumulator):
+    """Test join and list modes."""
+    gene, count = accumulator.to_arrays(delimiter=",")
+    assert gene.to_pylist() == ["CDC20", "ANLN,PRC1", None]
+    assert count.to_pylist() == [None, None, "5"]
+
+    gene, count = accumulator.to_arrays(mode=MULTI_VALUE_LIST, infer_types=True)
+    assert gene.type == pa.list_(pa.string())
+    assert gene.to_pylist() == [["CDC20"], ["ANLN", "PRC1"], None]
+    assert count.type == pa.int64()
+
+
+def test_image_in_several_rows():
+    """An Image in several Datasets has a row for each, with the same values."""
+    accumulator = KeyValueAccumulator()
+    for image_id in [1, 2, 1, 3]:
+        accumulator.add_image(image_id)
+    accumulator.add(1, "Gene", "CDC20")
+    accumulator.add(2, "Gene", "ANLN")
+    accumulator.add(3, "Gene", "PRC1")
+    assert len(accumulator) == 4
+    rows = list(accumulator.iter_rows())
+    assert rows == [["CDC20"], ["ANLN"], ["CDC20"], ["PRC1"]]
+    (gene,) = accumulator.to_arrays()
+    assert gene.to_pylist() == ["CDC20", "ANLN", "CDC20", "PRC1"]
+
+
+@pytest.mark.parametrize(
+    "values, value_type",
+    [
+        (["1", "25", None], pa.int64()),
+        (["1.5", "2"], pa.float64()),
+        (["01", "2"], pa.string()),
+        (["007"], pa.string()),
+        (["A01"], pa.string()),
+    ],
+)
+def test_infer_type(values, value_type):
+    """Only values that are unchanged as strings are cast to numbers."""
+    assert infer_type(pa.array(values)).type == value_type
+    list_type = pa.list_(value_type)
+    assert infer_type(pa.array([values], type=pa.list_(pa.string()))).type == list_type
+
+
+def test_no_keys():
+    """Images without Key-Value pairs still have a row each."""
+    accumulator = KeyValueAccumulator()
+    accumulator.add_image(1)
+    accumulator.add_image(2)
+    assert accumulator.keys() == []
+    assert list(accumulator.iter_rows()) == [[], []]
+    assert accumulator.to_arrays() == []
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2025 University of Dundee.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+The export script can't import omero_biofilefinder, so it has copies of
+some of its code. Check that the copies are the same as the originals.
+"""
+
+import ast
+import os
+
+import pytest
+
+import omero_biofilefinder
+
+PACKAGE_DIR = os.path.dirname(omero_biofilefinder.__file__)
+SCRIPT_PATH = os.path.join(
+    PACKAGE_DIR, "scripts", "omero", "annotation_scripts", "Export_to_Biofile_Finder.py"
+)
+
+COPIED = {
+    "kvp_accumulator.py": [
+        "MULTI_VALUE_JOIN",
+        "MULTI_VALUE_LIST",
+        "MULTI_VALUE_MODES",
+        "infer_type",
+        "KeyValueAccumulator",
+    ],
+    "table_stats.py": [
+        "STATS_KEY",
+        "MAX_VALUE_COUNTS",
+        "IMAGE_COLUMNS",
+        "MAP_LINK_COUNT_KEY",
+        "column_stats",
+        "compute_stats",
+        "with_stats",
+    ],
+    "image_metadata.py": [
+        "EXTRA_COLUMNS",
+        "QUERIES",
+        "LIST_COLUMNS",
+        "parse_extra_columns",
+        "_pixel_sizes",
+        "load_image_metadata",
+        "metadata_arrays",
+    ],
+}
+
+
+def definitions(path):
+    """Return {name: AST dump} for the functions, classes and constants."""
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    result = {}
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+            result[node.name] = ast.dump(node)
+        elif isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    result[target.id] = ast.dump(node.value)
+    return result
+
+
+@pytest.mark.parametrize(
+    "module, name", [(module, name) for module in COPIED for name in COPIED[module]]
+)
+def test_copied_code(module, name):
+    original = definitions(os.path.join(PACKAGE_DIR, module))
+    copy = definitions(SCRIPT_PATH)
+    assert name in copy, f"{name} from {module} is missing in the script"
+    assert copy[name] == original[name], f"{name} differs from {module}"
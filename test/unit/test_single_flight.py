@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2025 University of Dundee.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Unit tests for sharing identical concurrent exports."""
+
+import fcntl
+import os
+import threading
+import time
+
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from omero_biofilefinder import single_flight
+
+
+class Options:
+    def getOmeroGroup(self):
+        return 3
+
+
+class Connection:
+    """Just enough of a BlitzGateway for the single-flight key."""
+
+    SERVICE_OPTS = Options()
+
+    def getUserId(self):
+        return 2
+
+
+class WaitingEvent(threading.Event):
+    """An Event that counts the threads that started waiting for it."""
+
+    waiting = threading.Semaphore(0)
+
+    def wait(self, timeout=None):
+        WaitingEvent.waiting.release()
+        return super().wait(timeout)
+
+
+class CountingFlight(single_flight._Flight):
+    def __init__(self):
+        super().__init__()
+        self.done = WaitingEvent()
+
+
+@pytest.fixture(autouse=True)
+def no_file_lock(monkeypatch):
+    """Share requests in this process only, with a fresh semaphore."""
+    monkeypatch.setattr(single_flight.settings, "SINGLE_FLIGHT_DIR", "")
+    monkeypatch.setattr(single_flight.settings, "SINGLE_FLIGHT_TIMEOUT", 10)
+    monkeypatch.setattr(single_flight.settings, "RETRY_AFTER", 30)
+    monkeypatch.setattr(single_flight, "_export_slots", threading.BoundedSemaphore(1))
+    monkeypatch.setattr(single_flight, "_Flight", CountingFlight)
+    WaitingEvent.waiting = threading.Semaphore(0)
+
+
+def blocking_view(release, calls, error=None):
+    """Return a view that waits for release before responding."""
+
+    @single_flight.single_flight
+    def view(request, conn=None):
+        calls.append(request.path)
+        assert release.wait(10)
+        if error is not None:
+            raise error
+        return HttpResponse(b"table", content_type="text/csv")
+
+    return view
+
+
+def run_in_threads(view, paths):
+    """Call the view for each path in a thread. Return the thread results."""
+    results = [None] * len(paths)
+
+    def call(i, path):
+        request = RequestFactory().get(path)
+        try:
+            results[i] = view(request, conn=Connection())
+        except Exception as error:
+            results[i] = error
+
+    threads = [
+        threading.Thread(target=call, args=(i, path)) for i, path in enumerate(paths)
+    ]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_followers_share_response():
+    """Identical requests wait for the first one and copy its response."""
+    release = threading.Event()
+    calls = []
+    view = blocking_view(release, calls)
+    threads, results = run_in_threads(view, ["/table.csv"] * 3)
+    # Let the leader finish once both followers are waiting
+    for _ in range(2):
+        assert WaitingEvent.waiting.acquire(timeout=10)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == ["/table.csv"]
+    for response in results:
+        assert response.status_code == 200
+        assert response.content == b"table"
+        assert response["Content-Type"] == "text/csv"
+    assert single_flight._flights == {}
+
+
+def test_followers_share_error():
+    """An error in the leader is raised for the waiting requests too."""
+    release = threading.Event()
+    calls = []
+    view = blocking_view(release, calls, error=ValueError("failed"))
+    threads, results = run_in_threads(view, ["/table.csv"] * 2)
+    assert WaitingEvent.waiting.acquire(timeout=10)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert [type(result) for result in results] == [ValueError, ValueError]
+    assert single_flight._flights == {}
+
+
+def test_busy():
+    """Requests beyond max_concurrent_exports get a 503 response."""
+    release = threading.Event()
+    calls = []
+    view = blocking_view(release, calls)
+    threads, results = run_in_threads(view, ["/table.csv"])
+    while not calls:
+        time.sleep(0.01)
+
+    response = view(RequestFactory().get("/other.csv"), conn=Connection())
+    assert response.status_code == 503
+    assert response["Retry-After"] == "30"
+
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == ["/table.csv"]
+    assert results[0].status_code == 200
+
+    # The slot is free again
+    response = view(RequestFactory().get("/other.csv"), conn=Connection())
+    assert response.status_code == 200
+    assert calls == ["/table.csv", "/other.csv"]
+
+
+def test_file_lock(monkeypatch, tmp_path):
+    """Results are shared through files, and old results are removed."""
+    monkeypatch.setattr(single_flight.settings, "SINGLE_FLIGHT_DIR", str(tmp_path))
+    result = {"status": 200, "headers": {"Content-Type": "text/csv"}}
+    calls = []
+
+    def func():
+        calls.append(1)
+        return dict(result, content=b"table")
+
+    assert single_flight._run_with_file_lock("key", func)["content"] == b"table"
+    # Results written before we started waiting are not used
+    assert single_flight._run_with_file_lock("key", func)["content"] == b"table"
+    assert len(calls) == 2
+    names = sorted(os.listdir(tmp_path))
+    assert [name.split(".", 1)[1] for name in names] == ["content", "json", "lock"]
+
+    old = time.time() - 3 * single_flight.settings.SINGLE_FLIGHT_TIMEOUT
+    for name in names:
+        os.utime(tmp_path / name, (old, old))
+    single_flight._run_with_file_lock("other", func)
+    remaining = os.listdir(tmp_path)
+    assert len(remaining) == 3
+    assert [name for name in names if name in remaining] == []
+
+
+def test_old_lock_file_held(monkeypatch, tmp_path):
+    """Old lock files are kept while another worker holds them."""
+    monkeypatch.setattr(single_flight.settings, "SINGLE_FLIGHT_DIR", str(tmp_path))
+    lock_path = tmp_path / "held.lock"
+    old = time.time() - 3 * single_flight.settings.SINGLE_FLIGHT_TIMEOUT
+    with open(lock_path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        os.utime(lock_path, (old, old))
+        single_flight._remove_old_results(str(tmp_path))
+        assert lock_path.exists()
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+    single_flight._remove_old_results(str(tmp_path))
+    assert not lock_path.exists()
+
+
+def test_lock_file_removed_while_waiting(monkeypatch, tmp_path):
+    """A lock file removed before we locked it is not used."""
+    monkeypatch.setattr(single_flight.settings, "SINGLE_FLIGHT_DIR", str(tmp_path))
+    lock_path = str(tmp_path / "removed.lock")
+    opened = []
+    real_open = open
+
+    def open_and_remove(path, mode="r", *args, **kwargs):
+        f = real_open(path, mode, *args, **kwargs)
+        if path == lock_path:
+            opened.append(path)
+            if len(opened) == 1:
+                # As if _remove_old_results() ran in another worker
+                os.remove(path)
+        return f
+
+    monkeypatch.setattr("builtins.open", open_and_remove)
+    with single_flight._locked_file(lock_path, time.time()):
+        # We locked the file that other workers will open
+        assert len(opened) == 2
+        assert os.path.exists(lock_path)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2025 University of Dundee.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Unit tests for the cache of BFF tables."""
+
+import fcntl
+import os
+import time
+
+import pyarrow as pa
+import pytest
+
+from omero_biofilefinder import table_cache
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(table_cache.settings, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(table_cache.settings, "CACHE_TTL", 300)
+    return table_cache.get_cache_dir("tables")
+
+
+def test_get_table_path():
+    """Tables are built once, then rebuilt when they are too old."""
+    builds = []
+
+    def build_table():
+        builds.append(1)
+        return pa.table({"Gene": ["CDC20"]})
+
+    path = table_cache.get_table_path(["project", "1"], build_table)
+    assert table_cache.get_table_path(["project", "1"], build_table) == path
+    assert len(builds) == 1
+    assert table_cache._path_locks == {}
+
+    old = time.time() - 400
+    os.utime(path, (old, old))
+    assert table_cache.get_table_path(["project", "1"], build_table) == path
+    assert len(builds) == 2
+
+
+def test_remove_old_tables(cache_dir):
+    """Old tables and lock files are removed, unless the lock is held."""
+    old = time.time() - 3600
+    for name in ["old.parquet", "old.parquet.lock", "held.parquet.lock", "new.parquet"]:
+        path = os.path.join(cache_dir, name)
+        open(path, "wb").close()
+        if name.startswith(("old", "held")):
+            os.utime(path, (old, old))
+
+    with open(os.path.join(cache_dir, "held.parquet.lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        table_cache.remove_old_tables()
+    assert sorted(os.listdir(cache_dir)) == ["held.parquet.lock", "new.parquet"]
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2025 University of Dundee.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Unit tests for querying BFF tables."""
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from omero_biofilefinder.table_query import facet_counts
+
+
+@pytest.fixture()
+def path(tmp_path):
+    """Return the path to a parquet file with a list column."""
+    table = pa.table(
+        {
+            "Gene": [["x", "x"], ["x", "y"], None],
+            "Cell Line": ["HeLa", "HeLa", "U2OS"],
+        }
+    )
+    path = str(tmp_path / "table.parquet")
+    pq.write_table(table, path)
+    return path
+
+
+def test_facet_counts(path):
+    """Rows are counted once for each value, even if a list repeats it."""
+    counts = facet_counts(path, "Gene").to_pylist()
+    assert counts == [{"values": "x", "counts": 2}, {"values": "y", "counts": 1}]
+    counts = facet_counts(path, "Cell Line").to_pylist()
+    assert counts == [
+        {"values": "HeLa", "counts": 2},
+        {"values": "U2OS", "counts": 1},
+    ]
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2025 University of Dundee.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""Unit tests for BFF table statistics."""
+
+import pyarrow as pa
+
+from omero_biofilefinder.table_stats import compute_stats
+
+
+def test_compute_stats():
+    """Value counts are only computed for Key-Value columns."""
+    table = pa.table(
+        {
+            "File Path": ["http://a/1", "http://a/2", "http://a/3"],
+            "Gene": ["CDC20", "ANLN", "CDC20"],
+            "Count": [5, None, 2],
+        }
+    )
+    stats = compute_stats(table)
+    assert stats["num_rows"] == 3
+    path_stats = stats["columns"]["File Path"]
+    assert "value_counts" not in path_stats
+    assert path_stats["distinct_count"] == 3
+    assert path_stats["min"] == "http://a/1"
+    assert path_stats["max"] == "http://a/3"
+    gene_stats = stats["columns"]["Gene"]
+    assert gene_stats["distinct_count"] == 2
+    assert gene_stats["value_counts"] == [["CDC20", 2], ["ANLN", 1]]
+    count_stats = stats["columns"]["Count"]
+    assert count_stats["null_count"] == 1
+    assert [count_stats["min"], count_stats["max"]] == [2, 5]